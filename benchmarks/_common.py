@@ -0,0 +1,58 @@
+"""Helpers shared by the benchmark scripts in this directory: running commands, and saving and comparing results."""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_PATH = os.path.join(REPO_PATH, "src")
+
+
+def run(command, cwd=None, env=None, input=None):
+    completed_process = subprocess.run(command, cwd=cwd, env=env, input=input, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE)
+    if completed_process.returncode != 0:
+        raise RuntimeError(f"Failed running {command}:\n{completed_process.stdout}{completed_process.stderr}")
+    return completed_process.stdout.decode("utf-8")
+
+
+def timed_run(command, cwd=None, env=None):
+    start_time = time.perf_counter()
+    run(command, cwd=cwd, env=env)
+    return time.perf_counter() - start_time
+
+
+def add_baseline_arguments(parser):
+    parser.add_argument("--output", help="file to save results to, as JSON")
+    parser.add_argument("--baseline", help="JSON results to compare with. Exits with an error on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs baseline. Defaults to 0.2")
+
+
+def regressions(timings, baseline_timings, tolerance, unit):
+    return [
+        f"{name}: {timings[name]}{unit} vs {baseline_timings[name]}{unit} in baseline"
+        for name in timings
+        if name in baseline_timings and timings[name] > baseline_timings[name] * (1 + tolerance)
+    ]
+
+
+def report(results, args, timings, unit, check_baseline=None):
+    # Prints the results as JSON, saves them to --output, and exits with an error if they regressed from --baseline.
+    # `timings` gets the {name: time} to compare out of results, and `check_baseline` is called with the baseline.
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if check_baseline:
+            check_baseline(baseline)
+        found_regressions = regressions(timings(results), timings(baseline), args.tolerance, unit)
+        if found_regressions:
+            print("Regressions found:\n" + "\n".join(found_regressions), file=sys.stderr)
+            sys.exit(1)
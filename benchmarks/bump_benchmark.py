@@ -0,0 +1,172 @@
+"""Measures how bumping and undoing scale, on synthetic Git repositories generated in temporary directories.
+
+The generated repository has --files files of --file-size bytes, each one containing the version --matches-per-file
+times, --history-depth commits and --tags tags. Each scenario runs bumpytrack from the sources in this repository, in a
+fresh process. Results are printed as JSON, together with the parameters and the bumpytrack commit they were taken at,
+and can be saved and passed back with --baseline to fail when something got slower than allowed by --tolerance:
+
+    python benchmarks/bump_benchmark.py --files 5000 --output baseline.json
+    # ...change things...
+    python benchmarks/bump_benchmark.py --files 5000 --baseline baseline.json
+"""
+
+import argparse
+import os
+import platform
+import statistics
+import sys
+import tempfile
+
+from _common import REPO_PATH, SRC_PATH, add_baseline_arguments, report, run, timed_run
+
+
+VERSION = "1.2.3"
+FILES_DIR = "files"
+
+
+# Repository generation ########################################################
+
+
+def file_contents(file_size, matches_per_file):
+    # Filler text with the version spread evenly across it
+    version_line = f"version = {VERSION}\n".encode("utf-8")
+    filler_size = max(0, file_size - matches_per_file * len(version_line))
+    filler = (b"Lorem ipsum dolor sit amet, consectetur adipiscing elit.\n" * (filler_size // 57 + 1))[:filler_size]
+    section_size = filler_size // (matches_per_file + 1)
+    parts = []
+    for match_index in range(matches_per_file):
+        parts.append(filler[match_index * section_size:(match_index + 1) * section_size])
+        parts.append(version_line)
+    parts.append(filler[matches_per_file * section_size:])
+    return b"".join(parts)
+
+
+def config_contents():
+    return (
+        "[tool.bumpytrack]\n"
+        f"current_version = \"{VERSION}\"\n"
+        "\n"
+        "[[tool.bumpytrack.file_replaces]]\n"
+        f"path = \"{FILES_DIR}/**/*.txt\"\n"
+        "search_template = \"version = {version}\"\n"
+    ).encode("utf-8")
+
+
+def fast_import_stream(files, file_size, matches_per_file, history_depth, tags):
+    # Builds the whole history with a single git fast-import, which is much faster than committing one by one
+    commands = []
+
+    def data(contents):
+        commands.append(f"data {len(contents)}\n".encode("utf-8") + contents + b"\n")
+
+    def commit(mark, message, file_modifications):
+        commands.append(f"commit refs/heads/master\nmark :{mark}\n".encode("utf-8"))
+        commands.append(f"committer Benchmark <benchmark@bumpytrack> {1500000000 + mark} +0000\n".encode("utf-8"))
+        data(message.encode("utf-8"))
+        if mark > 1:
+            commands.append(f"from :{mark - 1}\n".encode("utf-8"))
+        for path, contents in file_modifications:
+            commands.append(f"M 100644 inline {path}\n".encode("utf-8"))
+            data(contents)
+
+    for mark in range(1, history_depth):
+        commit(mark, f"Commit {mark}", [("history.txt", f"{mark}\n".encode("utf-8"))])
+
+    contents = file_contents(file_size, matches_per_file)
+    file_modifications = [("pyproject.toml", config_contents())]
+    for file_index in range(files):
+        file_modifications.append((f"{FILES_DIR}/{file_index // 100:04d}/{file_index:06d}.txt", contents))
+    commit(max(1, history_depth), "Add files", file_modifications)
+
+    for tag_index in range(tags):
+        commands.append(f"reset refs/tags/v0.0.{tag_index}\nfrom :{1 + tag_index % max(1, history_depth)}\n".encode("utf-8"))
+
+    return b"".join(commands)
+
+
+def create_repo(path, args):
+    run(["git", "init", "-q"], cwd=path)
+    run(["git", "symbolic-ref", "HEAD", "refs/heads/master"], cwd=path)  # Whatever the default branch is
+    run(["git", "config", "user.email", "benchmark@bumpytrack"], cwd=path)
+    run(["git", "config", "user.name", "Benchmark"], cwd=path)
+    stream = fast_import_stream(args.files, args.file_size, args.matches_per_file, args.history_depth, args.tags)
+    run(["git", "fast-import", "--quiet"], cwd=path, input=stream)
+    run(["git", "reset", "-q", "--hard", "master"], cwd=path)
+
+
+def reset_repo(path):
+    run(["git", "reset", "-q", "--hard", "master"], cwd=path)
+
+
+# Scenarios ####################################################################
+
+
+def measure(repo_path, args):
+    env = dict(os.environ, PYTHONPATH=SRC_PATH)
+    bumpytrack = [sys.executable, "-m", "bumpytrack"]
+    git_options = ["--git-backend", args.git_backend] if args.git_backend else []
+    samples = {"bump": [], "bump_without_git": [], "git-undo": []}
+
+    for _ in range(args.repetitions):
+        samples["bump_without_git"].append(
+            timed_run(bumpytrack + ["patch", "--no-git-commit", "--no-git-tag"], cwd=repo_path, env=env))
+        reset_repo(repo_path)
+
+        samples["bump"].append(
+            timed_run(bumpytrack + ["patch", "--git-commit", "--git-tag"] + git_options, cwd=repo_path, env=env))
+        samples["git-undo"].append(timed_run(bumpytrack + ["git-undo"], cwd=repo_path, env=env))
+        reset_repo(repo_path)
+
+    return {
+        name: {"median": round(statistics.median(values), 4), "min": round(min(values), 4)}
+        for name, values in samples.items()
+    }
+
+
+def bumpytrack_commit():
+    try:
+        return run(["git", "rev-parse", "HEAD"], cwd=REPO_PATH).strip()
+    except RuntimeError:
+        return None
+
+
+def median_timings(results):
+    return {name: timings["median"] for name, timings in results["results"].items()}
+
+
+def check_baseline_parameters(results, baseline):
+    if baseline["parameters"] != results["parameters"]:
+        print("Warning: baseline was taken with different parameters.", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure bumping and undoing in synthetic repositories (in seconds).")
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--file-size", type=int, default=4096, help="in bytes")
+    parser.add_argument("--matches-per-file", type=int, default=1)
+    parser.add_argument("--history-depth", type=int, default=100, help="number of commits")
+    parser.add_argument("--tags", type=int, default=10)
+    parser.add_argument("--git-backend", choices=["porcelain", "plumbing"])
+    parser.add_argument("--repetitions", type=int, default=3)
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bumpytrack-benchmark-") as repo_path:
+        create_repo(repo_path, args)
+        results = {
+            "bumpytrack_commit": bumpytrack_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": {
+                name: getattr(args, name)
+                for name in ("files", "file_size", "matches_per_file", "history_depth", "tags", "git_backend")
+            },
+            "results": measure(repo_path, args),
+        }
+
+    report(results, args, timings=median_timings, unit="s",
+           check_baseline=lambda baseline: check_baseline_parameters(results, baseline))
+
+
+if __name__ == "__main__":
+    main()
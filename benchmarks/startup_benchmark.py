@@ -0,0 +1,88 @@
+"""Measures bumpytrack's startup time: module import time and cold-run time of each subcommand.
+
+Every measurement runs in a fresh interpreter, using the sources in this repository. Results are printed as JSON, and
+can be saved and passed back with --baseline to fail when something got slower than allowed by --tolerance:
+
+    python benchmarks/startup_benchmark.py --output baseline.json
+    # ...change things...
+    python benchmarks/startup_benchmark.py --baseline baseline.json
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+
+from _common import REPO_PATH, SRC_PATH, add_baseline_arguments, report, run, timed_run
+
+
+TEST_DATA_PATH = os.path.join(REPO_PATH, "tests", "data")
+
+IMPORT_TIMING_CODE = (
+    "import time; start = time.perf_counter(); import bumpytrack; print(time.perf_counter() - start)"
+)
+
+
+def benchmark_env():
+    env = dict(os.environ, PYTHONPATH=SRC_PATH)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)  # Measure what users get, with cached bytecode
+    return env
+
+
+def create_project(path):
+    shutil.copyfile(os.path.join(TEST_DATA_PATH, "integration_tests_pyproject.toml"), os.path.join(path, "pyproject.toml"))
+    shutil.copyfile(os.path.join(TEST_DATA_PATH, "replaceable.txt"), os.path.join(path, "replaceable.txt"))
+    for command in (
+        ["git", "init", "-q"],
+        ["git", "config", "user.email", "benchmark@bumpytrack"],
+        ["git", "config", "user.name", "benchmark"],
+        ["git", "add", "."],
+        ["git", "commit", "-q", "-m", "Initial commit."],
+    ):
+        run(command, cwd=path)
+
+
+def measure(repetitions):
+    env = benchmark_env()
+    bumpytrack = [sys.executable, "-m", "bumpytrack"]
+    run([sys.executable, "-c", "import bumpytrack"], env=env)  # Warm bytecode cache
+
+    samples = {
+        "python_startup": [],
+        "import": [],
+        "--version": [],
+        "--help": [],
+        "bump": [],
+        "bump_with_git": [],
+        "git-undo": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="bumpytrack-benchmark-") as project_path:
+        create_project(project_path)
+        for _ in range(repetitions):
+            samples["python_startup"].append(timed_run([sys.executable, "-c", "pass"], env=env))
+            samples["import"].append(float(run([sys.executable, "-c", IMPORT_TIMING_CODE], env=env)))
+            samples["--version"].append(timed_run(bumpytrack + ["--version"], env=env))
+            samples["--help"].append(timed_run(bumpytrack + ["--help"], env=env))
+            samples["bump"].append(timed_run(
+                bumpytrack + ["patch", "--no-git-commit", "--no-git-tag"], cwd=project_path, env=env))
+            run(["git", "commit", "-q", "-a", "-m", "Bumped without bumpytrack."], cwd=project_path)
+            samples["bump_with_git"].append(timed_run(
+                bumpytrack + ["patch", "--git-commit", "--git-tag"], cwd=project_path, env=env))
+            samples["git-undo"].append(timed_run(bumpytrack + ["git-undo"], cwd=project_path, env=env))
+
+    return {name: round(statistics.median(values) * 1000, 3) for name, values in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure bumpytrack's startup time (median, in milliseconds).")
+    parser.add_argument("--repetitions", type=int, default=10)
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    report(measure(args.repetitions), args, timings=lambda results: results, unit="ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -26,7 +26,7 @@ setuptools.setup(
     include_package_data=True,
     zip_safe=False,
     install_requires=[
-        "toml>=0.9.4",
+        "toml>=0.9.4; python_version < '3.11'",  # tomllib is used instead when available
     ],
     entry_points={
         "console_scripts": [
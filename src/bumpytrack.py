@@ -1,8 +1,11 @@
-import codecs
+# Only modules that are cheap to import are imported here. The rest are imported where used, so that the fast paths
+# (like `--version` or bumping without Git) don't pay for what they don't use.
 import os
-import subprocess
 import sys
-import toml
+import time
+
+
+VERSION_MESSAGE = "Version: 1.1.7"  # Replaced by bumpytrack itself
 
 
 # Misc #########################################################################
@@ -39,207 +42,2512 @@ def user_request(config_value, args_override, default):
 
 
 class Logger(object):
-    _verbose = False
+    # Prints messages. Library users can send them elsewhere by passing another logger to `bump` or `undo`: anything
+    # with `log`, `error` and `log_verbose` methods, like a subclass of this one.
+
+    def __init__(self, verbose=False):
+        import _thread  # Built in and already loaded, unlike `threading`, which would slow down startup
+        self._verbose = verbose
+        self._lock = _thread.allocate_lock()
 
     def set_verbose(self,verbose=True):
         self._verbose = verbose
 
-    @staticmethod
-    def log(message):
-        print(message)
+    def log(self, message):
+        self._write(sys.stdout, message)
 
-    @staticmethod
-    def error(message):
-        print(message, file=sys.stderr)
+    def error(self, message):
+        self._write(sys.stderr, message)
+
+    def _write(self, stream, message):
+        # In a single call, since `print` writes the newline apart, and messages logged from worker threads would then
+        # run together
+        with self._lock:
+            stream.write(f"{message}\n")
 
     def log_verbose(self, message):
         if self._verbose:
             self.log(message)
 
+
+class SilentLogger(Logger):
+    def log(self, message):
+        pass
+
+    def error(self, message):
+        pass
+
+
+class StandardLogger(Logger):
+    # Sends messages to Python's `logging`, verbose ones at the DEBUG level
+
+    def __init__(self, name="bumpytrack"):
+        import logging
+        super(StandardLogger, self).__init__(verbose=True)
+        self._logger = logging.getLogger(name)
+
+    def log(self, message):
+        self._logger.info(message)
+
+    def error(self, message):
+        self._logger.error(message)
+
+    def log_verbose(self, message):
+        self._logger.debug(message)
+
 logger = Logger()
 
 
 # System #######################################################################
 
 
-def fail(message):
-    logger.error(message + "\nAborting!\n")
+class BumpytrackError(Exception):
+    # Raised by `fail` when something can't be done. The command line reports it and exits with an error.
+    pass
+
+
+class ConfigError(BumpytrackError):
+    pass
+
+
+class VersionError(BumpytrackError):
+    pass
+
+
+class FileReplaceError(BumpytrackError):
+    pass
+
+
+class GitError(BumpytrackError):
+    pass
+
+
+class ConcurrentBumpError(BumpytrackError):
+    # Something else changed the repository while bumping it
+    pass
+
+
+def fail(message, error_class=BumpytrackError):
+    raise error_class(message)
+
+
+def abort(error):
+    logger.error(f"{error}\nAborting!\n")
     exit(1)
 
 
-def run_command(command_tokens, allow_failures=False):
-    completed_process = subprocess.run(
-        command_tokens,
-        encoding='utf-8',
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT
-    )
-    failed = completed_process.returncode != 0
+def run_command(command_tokens, allow_failures=False, input=None, env=None):
+    import subprocess
+    with tracer.span(" ".join(command_tokens[:2]), "subprocess", argv=command_tokens) as span:
+        completed_process = subprocess.run(
+            command_tokens,
+            input=input,
+            env=env,
+            encoding='utf-8',
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT
+        )
+        span.args["exit_code"] = completed_process.returncode
     output = completed_process.stdout.strip()  # Contains both stdout and stderr
-
+    return command_result(command_tokens, completed_process.returncode, output, allow_failures)
+
+
+async def run_command_async(command_tokens, allow_failures=False, input=None, env=None):
+    # Like `run_command`, but letting other tasks run meanwhile. `input` can also be an async iterable of strings, which
+    # are fed to the command as they come.
+    import asyncio
+    import subprocess
+    with tracer.span(" ".join(command_tokens[:2]), "subprocess", argv=command_tokens) as span:
+        process = await asyncio.create_subprocess_exec(
+            *command_tokens,
+            stdin=None if input is None else subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=env,
+        )
+
+        async def feed_input():
+            if isinstance(input, str):
+                process.stdin.write(input.encode("utf-8"))
+            else:
+                async for chunk in input:
+                    process.stdin.write(chunk.encode("utf-8"))
+                    await process.stdin.drain()
+            process.stdin.close()
+
+        try:
+            if input is None:
+                stdout = await process.stdout.read()
+            else:
+                stdout, _ = await asyncio.gather(process.stdout.read(), feed_input())
+        except BaseException:
+            process.terminate()  # E.g. the input couldn't be produced. Lets Git remove its lock files.
+            await process.wait()
+            raise
+        span.args["exit_code"] = await process.wait()
+    output = stdout.decode("utf-8").strip()  # Contains both stdout and stderr
+    return command_result(command_tokens, process.returncode, output, allow_failures)
+
+
+def command_result(command_tokens, returncode, output, allow_failures):
+    failed = returncode != 0
     if failed and not allow_failures:
         command = " ".join(command_tokens)
-        fail(f"Failed to execute '{command}'. Output was:\n\n{output}\n")
+        fail(f"Failed to execute '{command}'. Output was:\n\n{output}\n", GitError)
 
     if failed:
         return ErrorResult(output)
     else:
         return OkResult(output)
 
-# SemVer #######################################################################
 
+def log_spawned_processes():
+    processes = [span for span in tracer.spans if span.category == "subprocess"]
+    total_duration = sum(span.duration for span in processes)
+    logger.log_verbose(f"Spawned {len(processes)} processes in {total_duration:.3f}s:")
+    for span in processes:
+        logger.log_verbose(f"  {span.duration:.3f}s {' '.join(span.args['argv'])}")
 
-def parse_version(version):
-    try:
-        str_tokens = version.split(".")
 
-        if len(str_tokens) != 3:
-            fail("Failed paring current version. There should be exactly 3 tokens.")
+# Tracing ######################################################################
 
-        int_tokens = [int(str_token) for str_token in str_tokens]
-    except RuntimeError as error:
-        fail("Failed parsing current version: " + str(error))
 
-    return int_tokens
+class Span(object):
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args  # Can be completed while the span is open
+        self.thread_id = None
+        self.start = None
+        self.duration = None
 
+    def __enter__(self):
+        import threading
+        self.thread_id = threading.get_ident()
+        self.start = time.perf_counter()
+        return self
 
-def version_tokens_to_str(int_tokens):
-    return ".".join(str(int_token) for int_token in int_tokens)
+    def __exit__(self, *_exc_info):
+        self.duration = time.perf_counter() - self.start
+        self.tracer.spans.append(self)
+        return False
 
 
-def increment_version(current_version, part):
-    current_version_tokens = parse_version(current_version)
-
-    if part == "major":
-        new_version_tokens = [current_version_tokens[0] + 1, 0, 0]
-    elif part == "minor":
-        new_version_tokens = [current_version_tokens[0], current_version_tokens[1] + 1, 0]
-    elif part == "patch":
-        new_version_tokens = [current_version_tokens[0], current_version_tokens[1], current_version_tokens[2] + 1]
-    else:
-        fail(f"Part '{part}' not recognized. Should be one of: major, minor or patch.")
+class Tracer(object):
+    # Records how long things take. Spans are cheap enough to be always on, and are only reported if requested.
+
+    def __init__(self):
+        self.spans = []
+
+    def span(self, name, category="bumpytrack", **args):
+        return Span(self, name, category, args)
 
-    return version_tokens_to_str(new_version_tokens)
+    @staticmethod
+    def summary(spans):
+        # {span name: (calls, total duration, max duration)}, in the order they were first started
+        rows = {}
+        for span in sorted(spans, key=lambda span: span.start):
+            calls, total_duration, max_duration = rows.get(span.name, (0, 0.0, 0.0))
+            rows[span.name] = (calls + 1, total_duration + span.duration, max(max_duration, span.duration))
+        return rows
+
+    def summary_table(self):
+        # One row per span name, in the order they were first started
+        rows = self.summary(self.spans)
+
+        name_width = max([len("Span")] + [len(name) for name in rows])
+        lines = [f"{'Span':<{name_width}}  {'Calls':>6}  {'Total (ms)':>11}  {'Max (ms)':>11}"]
+        for name, (calls, total_duration, max_duration) in rows.items():
+            lines.append(f"{name:<{name_width}}  {calls:>6}  {total_duration * 1000:>11.3f}  {max_duration * 1000:>11.3f}")
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        # In the Trace Event Format, which both chrome://tracing and https://ui.perfetto.dev can open
+        origin = min((span.start for span in self.spans), default=0)
+        thread_ids = {}
+        events = []
+        for span in sorted(self.spans, key=lambda span: span.start):
+            thread_ids.setdefault(span.thread_id, len(thread_ids))
+            events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": round((span.start - origin) * 1e6, 3),
+                "dur": round(span.duration * 1e6, 3),
+                "pid": os.getpid(),
+                "tid": thread_ids[span.thread_id],
+                "args": span.args,
+            })
+        for thread_id, thread_index in thread_ids.items():
+            events.append({
+                "name": "thread_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "tid": thread_index,
+                "args": {"name": "main" if thread_index == 0 else f"worker {thread_index}"},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, trace_file_path):
+        import json
+        with open(trace_file_path, "w", encoding="utf-8") as file:
+            json.dump(self.chrome_trace(), file)
+
+tracer = Tracer()
+
+
+# SemVer #######################################################################
+
+
+SEMVER_PATTERN = (
+    r"(0|[1-9][0-9]*)\.(0|[1-9][0-9]*)\.(0|[1-9][0-9]*)"
+    r"(?:-((?:0|[1-9][0-9]*|[0-9]*[a-zA-Z-][0-9a-zA-Z-]*)(?:\.(?:0|[1-9][0-9]*|[0-9]*[a-zA-Z-][0-9a-zA-Z-]*))*))?"
+    r"(?:\+([0-9a-zA-Z-]+(?:\.[0-9a-zA-Z-]+)*))?"
+)
+VERSION_PARTS = ("major", "minor", "patch", "prerelease", "release")
+FIRST_PRERELEASE = ("rc", 1)
+
+
+class Version(object):
+    # A SemVer 2.0 version, not to be modified once created. Versions are ordered by precedence through a precomputed
+    # `sort_key`, in which build metadata doesn't count. It does count for equality, though.
+    __slots__ = ("major", "minor", "patch", "prerelease", "build", "sort_key")
+
+    def __init__(self, major, minor, patch, prerelease=(), build=()):
+        self.major = major
+        self.minor = minor
+        self.patch = patch
+        self.prerelease = tuple(prerelease)  # Identifiers, numeric ones as ints
+        self.build = tuple(build)
+        # Releases go after their prereleases, and numeric identifiers before alphanumeric ones
+        self.sort_key = (major, minor, patch, True, ()) if not prerelease else (major, minor, patch, False, tuple(
+            (True, 0, identifier) if isinstance(identifier, str) else (False, identifier, "")
+            for identifier in self.prerelease
+        ))
+
+    def __str__(self):
+        version = f"{self.major}.{self.minor}.{self.patch}"
+        if self.prerelease:
+            version += "-" + ".".join(str(identifier) for identifier in self.prerelease)
+        if self.build:
+            version += "+" + ".".join(self.build)
+        return version
+
+    def __repr__(self):
+        return f"Version('{self}')"
+
+    def __eq__(self, other):
+        return isinstance(other, Version) and self.sort_key == other.sort_key and self.build == other.build
+
+    def __hash__(self):
+        return hash((self.sort_key, self.build))
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+    def __le__(self, other):
+        return self.sort_key <= other.sort_key
+
+    def __gt__(self, other):
+        return self.sort_key > other.sort_key
+
+    def __ge__(self, other):
+        return self.sort_key >= other.sort_key
+
+    def bump(self, part):
+        # Build metadata is always dropped. As npm does, bumping a prerelease of the next major, minor or patch version
+        # just releases it (e.g. 'minor' turns 1.3.0-rc.1 into 1.3.0, not 1.4.0).
+        major, minor, patch = self.major, self.minor, self.patch
+        if part == "major":
+            return Version(major if self.prerelease and minor == patch == 0 else major + 1, 0, 0)
+        if part == "minor":
+            return Version(major, minor if self.prerelease and patch == 0 else minor + 1, 0)
+        if part == "patch":
+            return Version(major, minor, patch if self.prerelease else patch + 1)
+        if part == "prerelease":
+            if not self.prerelease:
+                return Version(major, minor, patch + 1, FIRST_PRERELEASE)
+            identifiers = list(self.prerelease)
+            if isinstance(identifiers[-1], int):
+                identifiers[-1] += 1
+            else:
+                identifiers.append(1)
+            return Version(major, minor, patch, identifiers)
+        if part == "release":
+            return Version(major, minor, patch)
+        raise ValueError(f"Unknown version part: '{part}'")
+
+
+# Parsing the same versions over and over is common, so parsed ones are kept, up to a limit
+parsed_versions = {}
+PARSED_VERSIONS_CACHE_SIZE = 100000
+
+
+def parse_versions(version_strs):
+    # Parses many versions at once, giving None for invalid ones
+    import re
+    semver_regex = re.compile(SEMVER_PATTERN)
+    cached_version = parsed_versions.get
+    return [
+        cached_version(version_str) or version_from_match(semver_regex.fullmatch(version_str), version_str)
+        for version_str in version_strs
+    ]
+
+
+def version_from_match(match, version_str):
+    if match is None:
+        return None
+    major, minor, patch, prerelease, build = match.groups()
+    prerelease_identifiers = [
+        int(identifier) if identifier.isdigit() else identifier for identifier in prerelease.split(".")
+    ] if prerelease else ()
+    version = Version(int(major), int(minor), int(patch), prerelease_identifiers, build.split(".") if build else ())
+    if len(parsed_versions) >= PARSED_VERSIONS_CACHE_SIZE:
+        parsed_versions.clear()
+    parsed_versions[version_str] = version
+    return version
+
+
+def parse_version(version_str):
+    [version] = parse_versions([version_str])
+    if version is None:
+        fail(f"Failed parsing version '{version_str}'. It should be a semantic version, like '1.2.3' or '1.2.3-rc.1'.", VersionError)
+    return version
+
+
+# Long lists of versions tend to repeat the same ones a lot, so the following parse and compare each distinct one once
+
+
+def invalid_versions(version_strs):
+    unique_version_strs = list(dict.fromkeys(version_strs))
+    return [
+        version_str for version_str, version in zip(unique_version_strs, parse_versions(unique_version_strs))
+        if version is None
+    ]
+
+
+def sort_versions(version_strs, reverse=False):
+    # Valid versions only, by precedence
+    import collections
+    counts = collections.Counter(version_strs)
+    unique_version_strs = list(counts)
+    versions_with_counts = [
+        (version, counts[version_str])
+        for version_str, version in zip(unique_version_strs, parse_versions(unique_version_strs))
+        if version is not None
+    ]
+    versions_with_counts.sort(key=lambda version_with_count: version_with_count[0].sort_key, reverse=reverse)
+    return [version for version, count in versions_with_counts for _ in range(count)]
+
+
+def max_version(version_strs):
+    # None if there are no valid versions
+    import operator
+    versions = [version for version in parse_versions(dict.fromkeys(version_strs)) if version is not None]
+    return max(versions, key=operator.attrgetter("sort_key"), default=None)
+
+
+def increment_version(current_version, part):
+    if part not in VERSION_PARTS:
+        fail(f"Part '{part}' not recognized. Should be one of: major, minor, patch, prerelease or release.", VersionError)
+    version = parse_version(current_version)
+    if part == "release" and not version.prerelease:
+        fail(f"Version '{current_version}' is not a prerelease, so there's nothing to release.", VersionError)
+    return str(version.bump(part))
 
 
 # Low-level task helpers #######################################################
 
 
-def file_replace(file_replace_config, current_version, new_version):
-    file_path = file_replace_config["path"]
-    logger.log_verbose(f"Replacing version string in '{file_path}'...")
+WORKSPACE_TAG_TEMPLATE = "{package}-v{version}"
 
-    search_template = file_replace_config.get("search_template", "{version}")
-    search = search_template.format(version=current_version)
-    replace = search_template.format(version=new_version)
-    logger.log_verbose(f"Searching '{search}' and replacing for '{replace}'...")
 
-    if not os.access(file_path, os.R_OK | os.W_OK):
-        fail(f"File '{file_path}' not found or not accessible.")
+def is_glob_pattern(path):
+    return any(char in path for char in "*?[")
+
 
-    original_file_contents = None
-    with codecs.open(file_replace_config["path"], "r", encoding="utf-8") as file:
-        original_file_contents = file.read()
+def is_excluded(path, exclude_patterns):
+    import fnmatch
+    normalized_path = path.replace(os.sep, "/")
+    return any(fnmatch.fnmatchcase(normalized_path, pattern) for pattern in exclude_patterns)
 
-    new_file_contents = original_file_contents.replace(search, replace)
-    if original_file_contents == new_file_contents:
-        fail(f"Nothing to replace in file '{file_path}'. This looks like a misconfiguration or an"
-             "inconsistent version in config file.")
 
-    with codecs.open(file_replace_config["path"], "w", encoding="utf-8") as file:
-        file.write(new_file_contents)
+def git_ignored_paths(paths):
+    if not paths:
+        return set()
+    result = run_command(["git", "check-ignore", "-z", "--stdin"], allow_failures=True, input="\0".join(paths))
+    # Git exits with 1 if no path is ignored and with 128 outside a repo. Either way there's nothing to filter out.
+    if not result.ok:
+        return set()
+    return set(path for path in result.value.split("\0") if path)
 
 
-def git_bump_commit(modified_files, current_version, new_version):
+def expand_file_replace_configs(file_replace_configs, respect_gitignore=True):
+    # Entries whose path is a glob pattern are expanded to one entry per matching file
+    matches_by_config = []
+    for file_replace_config in file_replace_configs:
+        pattern = file_replace_config["path"]
+        if not is_glob_pattern(pattern):
+            matches_by_config.append((file_replace_config, None))
+            continue
+
+        exclude_patterns = file_replace_config.get("exclude") or []
+        if isinstance(exclude_patterns, str):
+            exclude_patterns = [exclude_patterns]
+        matches = sorted(path for path in file_system.glob(pattern) if not is_excluded(path, exclude_patterns))
+        matches_by_config.append((file_replace_config, matches))
+
+    ignored_paths = set()
+    if respect_gitignore:
+        all_matches = [path for _, matches in matches_by_config if matches for path in matches]
+        ignored_paths = vcs.ignored_paths(all_matches)
+
+    expanded_file_replace_configs = []
+    for file_replace_config, matches in matches_by_config:
+        if matches is None:
+            expanded_file_replace_configs.append(file_replace_config)
+            continue
+
+        matches = [path for path in matches if path not in ignored_paths]
+        if not matches:
+            fail(f"No files found matching '{file_replace_config['path']}'. This looks like a misconfiguration.", ConfigError)
+        logger.log_verbose(f"Pattern '{file_replace_config['path']}' matched {len(matches)} files.")
+        for path in matches:
+            expanded_file_replace_configs.append(dict(file_replace_config, path=path))
+
+    return expanded_file_replace_configs
+
+
+FILE_REPLACE_CHUNK_SIZE = 1024 * 1024
+
+
+def stream_replace(source, destination, search, replace, chunk_size=FILE_REPLACE_CHUNK_SIZE, offsets=None):
+    # Copies `source` into `destination` replacing all occurrences of `search` with `replace`, holding at most one
+    # chunk in memory. The last `len(search) - 1` bytes of each chunk are carried over to the next one, so
+    # occurrences crossing chunk boundaries are found too. Returns the number of replacements done. If an `offsets`
+    # list is given, the offsets of the replacements in `destination` are appended to it.
+    replacements = 0
+    carry = b""
+    written = 0
+    while True:
+        chunk = source.read(chunk_size)
+        buffer = carry + chunk
+        position = 0
+        while True:
+            match_position = buffer.find(search, position)
+            if match_position == -1:
+                break
+            written += destination.write(buffer[position:match_position])
+            if offsets is not None:
+                offsets.append(written)
+            written += destination.write(replace)
+            position = match_position + len(search)
+            replacements += 1
+
+        if not chunk:
+            destination.write(buffer[position:])
+            return replacements
+
+        carry_start = max(position, len(buffer) - (len(search) - 1))
+        written += destination.write(buffer[position:carry_start])
+        carry = buffer[carry_start:]
+
+
+def stream_replace_many(source, destination, replacements, chunk_size=FILE_REPLACE_CHUNK_SIZE, offsets=None):
+    # Like `stream_replace`, but replacing several strings in a single pass. `replacements` maps each string to search
+    # to its replacement. Where more than one matches at the same position, the longest one wins. Returns the number of
+    # replacements done per searched string. If an `offsets` dict is given, the offsets of the replacements in
+    # `destination` are appended to the list of the corresponding searched string.
+    import re
+    searches = sorted(replacements, key=len, reverse=True)
+    pattern = re.compile(b"|".join(re.escape(search) for search in searches))
+    tail_length = len(searches[0]) - 1
+    counts = dict.fromkeys(replacements, 0)
+    carry = b""
+    written = 0
+    while True:
+        chunk = source.read(chunk_size)
+        buffer = carry + chunk
+        # A match starting in the tail may be cut short by the end of the chunk, so those are left for the next round
+        search_limit = len(buffer) - tail_length if chunk else len(buffer)
+        position = 0
+        for match in pattern.finditer(buffer):
+            if match.start() >= search_limit:
+                break
+            search = match.group()
+            written += destination.write(buffer[position:match.start()])
+            if offsets is not None:
+                offsets[search].append(written)
+            written += destination.write(replacements[search])
+            position = match.end()
+            counts[search] += 1
+
+        if not chunk:
+            destination.write(buffer[position:])
+            return counts
+
+        carry_start = max(position, search_limit)
+        written += destination.write(buffer[position:carry_start])
+        carry = buffer[carry_start:]
+
+
+def stream_splice(source, destination, splices, chunk_size=FILE_REPLACE_CHUNK_SIZE):
+    # Copies `source` into `destination` replacing the `(offset, length, replacement)` splices, sorted by offset, so
+    # that nothing has to be searched
+    position = 0
+    for offset, length, replacement in splices:
+        remaining = offset - position
+        while remaining > 0:
+            remaining -= destination.write(source.read(min(chunk_size, remaining)))
+        destination.write(replacement)
+        source.seek(length, os.SEEK_CUR)
+        position = offset + length
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return len(splices)
+        destination.write(chunk)
+
+
+class IndexingDestination(object):
+    # Passes writes through to `destination`, recording the offsets of all occurrences of the `searches` byte strings
+    # in what's written, whether they were just replaced or already there. Like in `stream_replace_many`, the longest
+    # one wins where several match. `finish` returns the offsets of each.
+    def __init__(self, destination, searches):
+        import re
+        searches = sorted(set(searches), key=len, reverse=True)
+        self.destination = destination
+        self.pattern = re.compile(b"|".join(re.escape(search) for search in searches))
+        self.tail_length = len(searches[0]) - 1
+        self.offsets = {search: [] for search in searches}
+        self.pending = b""
+        self.pending_offset = 0
+
+    def write(self, data):
+        self._record(self.pending + data, final=False)
+        return self.destination.write(data)
+
+    def finish(self):
+        self._record(self.pending, final=True)
+        return self.offsets
+
+    def _record(self, buffer, final):
+        # Matches starting in the tail may continue in the next write, so those are left for then
+        search_limit = len(buffer) if final else len(buffer) - self.tail_length
+        position = 0
+        for match in self.pattern.finditer(buffer):
+            if match.start() >= search_limit:
+                break
+            self.offsets[match.group()].append(self.pending_offset + match.start())
+            position = match.end()
+        pending_start = max(position, search_limit)
+        self.pending = buffer[pending_start:]
+        self.pending_offset += pending_start
+
+
+def write_temp_file(target_path, transform):
+    # Streams the file through `transform(source, destination)` into a temporary file next to it, with the same mode,
+    # so that it can later be atomically moved into place. The temporary file is removed if `transform` fails. Returns
+    # what `transform` returns, the temporary file path, and the bytes read and written. Missing files are read as
+    # empty ones.
+    import io
+    import shutil
+    import tempfile
+    temp_fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target_path), prefix=".bumpytrack-", suffix=".tmp")
+    try:
+        target_exists = os.path.exists(target_path)
+        with open(target_path, "rb") if target_exists else io.BytesIO() as source, \
+                os.fdopen(temp_fd, "wb") as destination:
+            result = transform(source, destination)
+            bytes_read = source.tell()
+            bytes_written = destination.tell()
+        if target_exists:
+            shutil.copymode(target_path, temp_path)
+        else:
+            os.chmod(temp_path, 0o644)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return result, temp_path, bytes_read, bytes_written
+
+
+def occurrences_at(file_path, splices):
+    with open(file_path, "rb") as file:
+        for offset, length, search in splices:
+            file.seek(offset)
+            if file.read(length) != search:
+                return False
+    return True
+
+
+def replacements_by_search(file_path, replacements):
+    # Work on the UTF-8 encoded bytes to avoid decoding and encoding the whole file. Since UTF-8 is self-synchronizing,
+    # this gives the same result as replacing in the decoded text.
+    replace_by_search = {}
+    for file_replace_config, current_version, new_version in replacements:
+        search_template = file_replace_config.get("search_template", "{version}")
+        search = search_template.format(version=current_version)
+        replace = search_template.format(version=new_version)
+        logger.log_verbose(f"Searching '{search}' and replacing for '{replace}'...")
+        if replace_by_search.get(search.encode("utf-8"), replace.encode("utf-8")) != replace.encode("utf-8"):
+            return ErrorResult(f"Conflicting replacements for '{search}' in file '{file_path}'.")
+        replace_by_search[search.encode("utf-8")] = replace.encode("utf-8")
+    return OkResult(replace_by_search)
+
+
+def not_found_error(file_path, counts):
+    not_found = [search.decode("utf-8") for search, count in counts.items() if count == 0]
+    if not_found:
+        return f"Nothing to replace in file '{file_path}' for '{', '.join(not_found)}'. This looks like a " \
+               "misconfiguration or an inconsistent version in config file."
+    return None
+
+
+def fail_with_file_errors(errors):
+    if len(errors) == 1:
+        fail(errors[0], FileReplaceError)
+    fail(f"Found problems in {len(errors)} files, so none was changed:\n" + "\n".join(errors), FileReplaceError)
+
+
+def changelog_section_of(file_path, replacements_for_file):
+    # OkResult with the section to add if `file_path` is the changelog, None otherwise
+    changelog_sections = [config["changelog_section"] for config, _, _ in replacements_for_file
+                          if "changelog_section" in config]
+    if changelog_sections and len(replacements_for_file) > 1:
+        return ErrorResult(f"File '{file_path}' can't be both the changelog and have versions replaced in it.")
+    return OkResult(changelog_sections[0] if changelog_sections else None)
+
+
+def replace_in_file_system(replacements, before_apply=None):
+    # Like `replace_in_files`, but through `file_system`, a whole file at a time and one after the other. Used with
+    # backends other than the local ones, which hold files in memory anyway. Returns what was done in each file, by
+    # path: a list of (search, replace, count) for replacements, or the section added to the changelog.
+    import io
+    new_contents = {}
+    done_by_path = {}
+    errors = []
+    for replacements_for_file in group_replacements_by_file(replacements):
+        file_path = replacements_for_file[0][0]["path"]
+        changelog_section_result = changelog_section_of(file_path, replacements_for_file)
+        if not changelog_section_result.ok:
+            errors.append(changelog_section_result.error)
+            continue
+
+        destination = io.BytesIO()
+        if changelog_section_result.value is not None:
+            source = io.BytesIO(file_system.read_bytes(file_path) if file_system.exists(file_path) else b"")
+            insert_changelog_section(source, destination, changelog_section_result.value.encode("utf-8"))
+            done_by_path[file_path] = changelog_section_result.value
+        else:
+            replace_by_search_result = replacements_by_search(file_path, replacements_for_file)
+            if not replace_by_search_result.ok:
+                errors.append(replace_by_search_result.error)
+                continue
+            if not file_system.exists(file_path):
+                errors.append(f"File '{file_path}' not found or not accessible.")
+                continue
+            replace_by_search = replace_by_search_result.value
+            contents = file_system.read_bytes(file_path)
+            span = replacements_for_file[0][0].get("span") if len(replacements_for_file) == 1 else None
+            _, current_version, new_version = replacements_for_file[0]
+            if span and contents[span[0]:span[1]] == current_version.encode("utf-8"):
+                # Like `_stage_file_replace`, only where the version was found when loading the config
+                destination.write(contents[:span[0]] + new_version.encode("utf-8") + contents[span[1]:])
+                counts = dict.fromkeys(replace_by_search, 1)
+            else:
+                counts = stream_replace_many(io.BytesIO(contents), destination, replace_by_search)
+            error = not_found_error(file_path, counts)
+            if error:
+                errors.append(error)
+                continue
+            done_by_path[file_path] = [(search.decode("utf-8"), replace_by_search[search].decode("utf-8"), count)
+                                       for search, count in counts.items()]
+        new_contents[file_path] = destination.getvalue()
+
+    if before_apply:
+        before_apply()
+    if errors:
+        fail_with_file_errors(errors)
+    for file_path, contents in new_contents.items():
+        file_system.write_bytes(file_path, contents)
+    return done_by_path
+
+
+class StagedFileReplace(object):
+    # A replacement that has already been checked, waiting to be applied. The new contents are either in a temporary
+    # file next to the target, or in `patches` to write in place when the replacements don't change the file's size.
+    def __init__(self, file_path, target_path, stats, new_offsets, temp_path=None, patches=None):
+        self.file_path = file_path
+        self.target_path = target_path
+        self.stats = stats
+        self.new_offsets = new_offsets
+        self.temp_path = temp_path
+        self.patches = patches
+
+    def apply(self, occurrence_index=None):
+        if self.temp_path is not None:
+            os.replace(self.temp_path, self.target_path)
+            self.temp_path = None
+        else:
+            with open(self.target_path, "r+b") as file:
+                for offset, replace in self.patches:
+                    file.seek(offset)
+                    file.write(replace)
+        if occurrence_index and self.new_offsets is not None:
+            occurrence_index.update(self.target_path, os.stat(self.target_path), self.new_offsets)
+        return self.file_path
+
+    def discard(self):
+        if self.temp_path is not None and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+        self.temp_path = None
+
+
+def stage_file_replace(file_path, replacements, occurrence_index=None):
+    with tracer.span("file_replace", "io", path=file_path) as span:
+        try:
+            result = _stage_file_replace(file_path, replacements, occurrence_index)
+        except OSError as error:
+            result = ErrorResult(f"Failed reading file '{file_path}' or writing next to it: {error.strerror}.")
+        if result.ok:
+            span.args.update(result.value.stats)
+        return result
+
+
+def _stage_file_replace(file_path, replacements, occurrence_index=None):
+    # Reads `file_path` applying all the (file_replace_config, current_version, new_version) `replacements` targeting
+    # it at once, but leaves the file untouched. Returns an OkResult with the StagedFileReplace, or an ErrorResult
+    # with what went wrong, so that problems in other files can be collected too.
+    logger.log_verbose(f"Replacing version string in '{file_path}'...")
+    replace_by_search_result = replacements_by_search(file_path, replacements)
+    if not replace_by_search_result.ok:
+        return replace_by_search_result
+    replace_by_search = replace_by_search_result.value
+
+    if not os.access(file_path, os.R_OK | os.W_OK):
+        return ErrorResult(f"File '{file_path}' not found or not accessible.")
+    target_path = os.path.realpath(file_path)
+
+    if len(replacements) == 1 and replacements[0][0].get("span"):
+        # Replace the version exactly where it was found when loading the config, if it's still there
+        (start, end), current_version, new_version = replacements[0][0]["span"], replacements[0][1], replacements[0][2]
+        splices = [(start, end - start, current_version.encode("utf-8"))]
+        if occurrences_at(target_path, splices):
+            logger.log_verbose(f"Replacing the version at offset {start} of '{file_path}'.")
+            return OkResult(stage_patch_file(
+                file_path, target_path, splices, {current_version.encode("utf-8"): new_version.encode("utf-8")}))
+
+    if occurrence_index:
+        # Patch the occurrences found last time, if they're still there
+        offsets = occurrence_index.get(target_path, os.stat(target_path), replace_by_search)
+        if offsets:
+            splices = sorted((offset, len(search), search) for search in offsets for offset in offsets[search])
+        if offsets and occurrences_at(target_path, splices):
+            logger.log_verbose(f"Using {len(splices)} indexed occurrences in '{file_path}'.")
+            return OkResult(stage_patch_file(file_path, target_path, splices, replace_by_search,
+                                             index_occurrences=True))
+
+    def replace_all(source, destination):
+        if occurrence_index:
+            destination = IndexingDestination(destination, replace_by_search.values())
+        if len(replace_by_search) == 1:
+            [(search, replace)] = replace_by_search.items()
+            counts = {search: stream_replace(source, destination, search, replace)}
+        else:
+            counts = stream_replace_many(source, destination, replace_by_search)
+        return counts, destination.finish() if occurrence_index else None
+
+    (counts, new_offsets), temp_path, bytes_read, bytes_written = write_temp_file(target_path, replace_all)
+    error = not_found_error(file_path, counts)
+    if error:
+        os.remove(temp_path)
+        return ErrorResult(error)
+    for search, count in counts.items():
+        logger.log_verbose(f"Replaced {count} occurrences of '{search.decode('utf-8')}' in '{file_path}'.")
+
+    stats = {
+        "replacements": {search.decode("utf-8"): count for search, count in counts.items()},
+        "bytes_read": bytes_read,
+        "bytes_written": bytes_written,
+    }
+    return OkResult(StagedFileReplace(file_path, target_path, stats, new_offsets, temp_path=temp_path))
+
+
+def stage_patch_file(file_path, target_path, splices, replace_by_search, index_occurrences=False):
+    # Stages replacing the occurrences at the given (offset, length, search) splices. In place if sizes don't change.
+    # Nothing else of the file is read, so the occurrences indexed are only the ones written, not the new version
+    # strings that were already elsewhere in it.
+    new_offsets = {replace: [] for replace in replace_by_search.values()} if index_occurrences else None
+    delta = 0
+    for offset, length, search in splices:
+        if index_occurrences:
+            new_offsets[replace_by_search[search]].append(offset + delta)
+        delta += len(replace_by_search[search]) - length
+
+    counts = {}
+    for _, _, search in splices:
+        counts[search.decode("utf-8")] = counts.get(search.decode("utf-8"), 0) + 1
+    replace_splices = [(offset, length, replace_by_search[search]) for offset, length, search in splices]
+
+    if all(len(search) == len(replace) for search, replace in replace_by_search.items()):
+        bytes_read = bytes_written = sum(length for _, length, _ in splices)
+        stats = {"replacements": counts, "bytes_read": bytes_read, "bytes_written": bytes_written}
+        patches = [(offset, replace) for offset, _, replace in replace_splices]
+        return StagedFileReplace(file_path, target_path, stats, new_offsets, patches=patches)
+
+    _, temp_path, bytes_read, bytes_written = write_temp_file(
+        target_path, lambda source, destination: stream_splice(source, destination, replace_splices))
+    stats = {"replacements": counts, "bytes_read": bytes_read, "bytes_written": bytes_written}
+    return StagedFileReplace(file_path, target_path, stats, new_offsets, temp_path=temp_path)
+
+
+def group_replacements_by_file(replacements):
+    # Each replacement is a (file_replace_config, current_version, new_version) tuple
+    replacements_by_file = {}
+    for replacement in replacements:
+        file_key = os.path.normcase(os.path.abspath(replacement[0]["path"]))
+        replacements_by_file.setdefault(file_key, []).append(replacement)
+    return list(replacements_by_file.values())
+
+
+def stage_replacements_for_file(replacements_for_file, occurrence_index=None):
+    file_path = replacements_for_file[0][0]["path"]
+    changelog_section_result = changelog_section_of(file_path, replacements_for_file)
+    if not changelog_section_result.ok:
+        return changelog_section_result
+    if changelog_section_result.value is not None:
+        return stage_changelog_update(file_path, changelog_section_result.value)
+    return stage_file_replace(file_path, replacements_for_file, occurrence_index)
+
+
+def discard_staged_file_replaces(stage_results):
+    for stage_result in stage_results:
+        if isinstance(stage_result, Result) and stage_result.ok:
+            stage_result.value.discard()
+
+
+def checked_staged_file_replaces(stage_results):
+    # Fails reporting all the problems found if any file can't be replaced, leaving all of them untouched
+    errors = [stage_result.error for stage_result in stage_results if not stage_result.ok]
+    if errors:
+        discard_staged_file_replaces(stage_results)
+        fail_with_file_errors(errors)
+    return [stage_result.value for stage_result in stage_results]
+
+
+def apply_staged_file_replaces(staged_file_replaces, occurrence_index=None):
+    try:
+        return [staged_file_replace.apply(occurrence_index) for staged_file_replace in staged_file_replaces]
+    finally:
+        for staged_file_replace in staged_file_replaces:
+            staged_file_replace.discard()
+
+
+def replace_in_files(replacements, jobs=None, occurrence_index=None, before_apply=None):
+    # Replaces in two phases, so that a problem in any file doesn't leave others half-bumped. First, all files are
+    # read, searched and their new contents written next to them, in parallel. Then, only if `before_apply` doesn't
+    # fail and all of them succeeded, the new contents are moved into place, which is just a rename per file. All
+    # entries targeting the same file are applied at once.
+    replacements_by_file = group_replacements_by_file(replacements)
+
+    if len(replacements_by_file) == 1 or jobs == 1:
+        stage_results = [stage_replacements_for_file(replacements_for_file, occurrence_index)
+                         for replacements_for_file in replacements_by_file]
+    else:
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            stage_results = list(executor.map(
+                lambda replacements_for_file: stage_replacements_for_file(replacements_for_file, occurrence_index),
+                replacements_by_file,
+            ))
+
+    if before_apply:
+        # Before reporting problems too, since those may come from someone else having changed the files meanwhile
+        try:
+            before_apply()
+        except BaseException:
+            discard_staged_file_replaces(stage_results)
+            raise
+    modified_files = apply_staged_file_replaces(checked_staged_file_replaces(stage_results), occurrence_index)
+    if occurrence_index:
+        occurrence_index.save()
+    return modified_files
+
+
+def relative_to_base_dir(file_replace_config, base_dir):
+    resolved_file_replace_config = dict(file_replace_config, path=os.path.join(base_dir, file_replace_config["path"]))
+    exclude_patterns = file_replace_config.get("exclude")
+    if exclude_patterns:
+        if isinstance(exclude_patterns, str):
+            exclude_patterns = [exclude_patterns]
+        normalized_base_dir = base_dir.replace(os.sep, "/")
+        resolved_file_replace_config["exclude"] = [normalized_base_dir + "/" + pattern for pattern in exclude_patterns]
+    return resolved_file_replace_config
+
+
+def bump_commit_message(current_version, new_version):
+    return f"Bumping version: {current_version} → {new_version}"
+
+
+def git_bump_commit(modified_files, commit_message):
     # TODO: make git path configurable
-    commit_message = f"Bumping version: {current_version} → {new_version}"
     run_command(["git", "reset", "HEAD"])
     run_command(["git", "add"] + modified_files)
     run_command(["git", "commit", "-m", commit_message])
 
 
-def git_bump_tag(new_version):
-    # TODO: make this format configurable
-    tag = f"v{new_version}"
+def git_bump_tag(tag):
     run_command(["git", "tag", tag])
 
 
-def git_undo_bump_commit(bumped_version):
-    last_commit_message = run_command(["git", "log", "-1", "--pretty=%B"]).value
-    is_bump = last_commit_message.startswith("Bumping version: ")
-    bumps_to_expected_version = last_commit_message.endswith(bumped_version)
-    if not (is_bump and bumps_to_expected_version):
+def git_head():
+    head_result = run_command(["git", "rev-parse", "--verify", "-q", "HEAD"], allow_failures=True)
+    return head_result.value if head_result.ok else None
+
+
+def git_temp_index_env(temp_dir):
+    return dict(os.environ, GIT_INDEX_FILE=os.path.join(temp_dir, "index"))
+
+
+def git_read_tree_command(head):
+    return ["git", "read-tree"] + ([head] if head else ["--empty"])
+
+
+def git_commit_tree(tree, head, commit_message):
+    return run_command(["git", "commit-tree", tree, "-m", commit_message] + (["-p", head] if head else [])).value
+
+
+def git_update_refs(head, target, commit_message=None, tags=()):
+    # Moves the current branch to the new commit (if any) and creates the tags in a single transaction
+    if target is None:
+        fail("There's no commit to tag.", GitError)
+    ref_updates = []
+    if commit_message:
+        ref_updates.append(f"update HEAD {target}" + (f" {head}" if head else ""))
+    for tag in tags:
+        ref_updates.append(f"create refs/tags/{tag} {target}")
+    run_command(["git", "update-ref", "-m", "bumpytrack: " + (commit_message or "tagging").splitlines()[0], "--stdin"],
+                input="\n".join(ref_updates) + "\n")
+
+
+def git_update_index(paths, env=None):
+    run_command(["git", "update-index", "--add", "-z", "--stdin"], input="\0".join(paths) + "\0", env=env)
+
+
+def git_plumbing_bump(modified_files, commit_message=None, tags=(), head=None):
+    # Builds the commit with plumbing commands on a temporary index, so that neither the user's index nor the whole
+    # working tree has to be read or refreshed. Refs are then updated in a single transaction, which fails if HEAD is
+    # no longer `head` (read here if not given). No commit is created if there's no `commit_message`. Returns the new
+    # commit, if any.
+    head = head or git_head()
+    target = head
+
+    if commit_message:
+        import tempfile
+        with tempfile.TemporaryDirectory(prefix="bumpytrack-") as temp_dir:
+            temp_index_env = git_temp_index_env(temp_dir)
+            run_command(git_read_tree_command(head), env=temp_index_env)
+            git_update_index(modified_files, env=temp_index_env)
+            tree = run_command(["git", "write-tree"], env=temp_index_env).value
+        target = git_commit_tree(tree, head, commit_message)
+
+    git_update_refs(head, target, commit_message, tags)
+
+    if commit_message:
+        # Leave the user's index in sync with the new commit for the modified files only
+        git_update_index(modified_files)
+        return target
+    return None
+
+
+GIT_PUSH_ATTEMPTS = 5
+GIT_PUSH_BACKOFF = 0.5  # Seconds before the first retry, doubled after each one
+
+
+def git_current_branch():
+    branch_result = run_command(["git", "symbolic-ref", "-q", "--short", "HEAD"], allow_failures=True)
+    if not branch_result.ok:
+        fail("Can't push from a detached HEAD. Check out a branch first.", GitError)
+    return branch_result.value
+
+
+def git_push_rejections(output):
+    # Refs rejected by the remote, with the reason, from the output of `git push --porcelain`. With `--atomic`, refs
+    # rejected only because others were, are reported as "atomic push failed".
+    rejections = {}
+    for line in output.splitlines():
+        if line.startswith("!\t"):
+            _, refspec, summary = line.split("\t", 2)
+            rejections[refspec.split(":")[-1]] = summary
+    return rejections
+
+
+def git_rebase_bump_onto_remote(remote, branch, tags):
+    # Replays the local commits on top of the remote branch, and moves the `tags` to the new HEAD
+    run_command(["git", "fetch", "-q", remote, f"refs/heads/{branch}"])
+    rebase_result = run_command(["git", "rebase", "-q", "--autostash", "FETCH_HEAD"], allow_failures=True)
+    if not rebase_result.ok:
+        run_command(["git", "rebase", "--abort"], allow_failures=True)
+        fail(f"Branch '{branch}' moved in '{remote}', and the bump could not be rebased onto it. Nothing was pushed. "
+             f"Output was:\n\n{rebase_result.error}\n", GitError)
+    for tag in tags:
+        run_command(["git", "tag", "-f", tag, "HEAD"])
+
+
+def git_push_bump(remote, tags, rebase=False):
+    # Pushes the current branch and the `tags` (only those) to `remote` in a single atomic push, so that the remote
+    # gets all of them or none. If the push is rejected because the remote branch moved, the bump is rebased onto it
+    # when `rebase` is set, and pushed again after a backoff. So is it after other failures, like a busy server.
+    # Returns the pushed commit if it changed because of rebasing.
+    import random
+    branch = git_current_branch()
+    refspecs = [f"refs/heads/{branch}:refs/heads/{branch}"] + [f"refs/tags/{tag}:refs/tags/{tag}" for tag in tags]
+    rebased = False
+    for attempt in range(GIT_PUSH_ATTEMPTS):
+        push_result = run_command(["git", "push", "--atomic", "--porcelain", remote] + refspecs, allow_failures=True)
+        if push_result.ok:
+            return git_head() if rebased else None
+
+        rejections = git_push_rejections(push_result.error)
+        rejected_tags = [ref for ref, summary in rejections.items()
+                         if ref.startswith("refs/tags/") and "atomic push failed" not in summary]
+        if rejected_tags:
+            fail(f"Tags rejected by '{remote}': {', '.join(rejected_tags)}. Nothing was pushed. Do they exist there "
+                 "already?", GitError)
+        branch_moved = any(reason in rejections.get(f"refs/heads/{branch}", "")
+                           for reason in ("fetch first", "non-fast-forward"))
+        if branch_moved and not rebase:
+            fail(f"Branch '{branch}' moved in '{remote}'. Nothing was pushed.", GitError)
+        if attempt == GIT_PUSH_ATTEMPTS - 1:
+            break
+
+        delay = GIT_PUSH_BACKOFF * 2 ** attempt * random.uniform(0.5, 1)
+        logger.log(f"Push to '{remote}' failed" + (" because the branch moved" if branch_moved else "") +
+                   f". Trying again in {delay:.1f}s.")
+        time.sleep(delay)
+        if branch_moved:
+            git_rebase_bump_onto_remote(remote, branch, tags)
+            rebased = True
+
+    fail(f"Failed pushing to '{remote}' after {GIT_PUSH_ATTEMPTS} attempts. Nothing was pushed. Output was:\n\n"
+         f"{push_result.error}\n", GitError)
+
+
+class GitObjectReader(object):
+    # A long-running `git cat-file --batch`, to read objects without spawning a process each time. The daemon's
+    # workers inherit it when forked, so each read holds a lock shared with them, for requests and responses not to
+    # get mixed up. Reading gives up if the lock can't be had in time, e.g. if a worker died holding it.
+    LOCK_TIMEOUT = 5
+
+    def __init__(self, repo_path):
+        import multiprocessing
+        import subprocess
+        self._lock = multiprocessing.Lock()
+        self._process = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=repo_path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def alive(self):
+        return self._process.poll() is None
+
+    def read(self, name):
+        # Returns the (type, contents) of the object, or None if it can't be read
+        if not self._lock.acquire(timeout=self.LOCK_TIMEOUT):
+            return None
+        try:
+            self._process.stdin.write(name.encode("utf-8") + b"\n")
+            self._process.stdin.flush()
+            header = self._process.stdout.readline().split()
+            if len(header) != 3:  # Missing, ambiguous or Git is gone
+                return None
+            contents = self._process.stdout.read(int(header[2]) + 1)[:-1]  # Followed by a newline
+        except (OSError, ValueError):
+            return None
+        finally:
+            self._lock.release()
+        return header[1].decode("utf-8"), contents
+
+
+# Started by the daemon for each repository it serves, keyed by its real path
+git_object_readers = {}
+
+
+def git_last_commit_message():
+    git_object_reader = git_object_readers.get(os.path.realpath(os.getcwd()))
+    last_commit = git_object_reader.read("HEAD") if git_object_reader else None
+    if last_commit is None or last_commit[0] != "commit":
+        return run_command(["git", "log", "-1", "--pretty=%B"]).value
+    return last_commit[1].decode("utf-8").split("\n\n", 1)[-1].strip()  # The message follows the headers
+
+
+def git_last_commit_is_bump_to(bumped_version):
+    last_commit_message = vcs.last_commit_message()
+    return last_commit_message.startswith("Bumping version: ") and last_commit_message.endswith(bumped_version)
+
+
+def git_undo_bump_commit(bumped_version, targeted=False):
+    if not git_last_commit_is_bump_to(bumped_version):
         return ErrorResult(("last_commit_is_not_the_bump_to_current_version", "Can only undo bumps corresponding to the most recent commit."))
-    commit_undo_result = run_command(["git", "reset", "--hard", "HEAD~1"])
-    if not commit_undo_result.ok:
+    if targeted and using_local_backends():
+        return git_targeted_undo_last_commit(f"bumpytrack: undo bump to {bumped_version}")
+    if not vcs.reset_last_commit():
         return ErrorResult(("other", "Git failed resetting to last commit."))
     return OkResult()
 
 
-def git_undo_bump_tag(bumped_version):
-    tag = f"v{bumped_version}"
-    tag_deletion_result = run_command(["git", "tag", "-d", tag], allow_failures=True)
-    if not tag_deletion_result.ok:
+def git_targeted_undo_last_commit(reflog_message):
+    # Like `git reset --hard HEAD~1`, but only restoring the files changed by the last commit. It takes the same time
+    # whatever the size of the repository, and leaves other local changes alone.
+    revisions_result = run_command(["git", "rev-parse", "HEAD", "HEAD~1"], allow_failures=True)
+    if not revisions_result.ok:
+        return ErrorResult(("other", "Git failed finding the last commit and its parent."))
+    head, parent = revisions_result.value.split()
+
+    changes = run_command(["git", "diff-tree", "-r", "-z", "--no-renames", "--name-status", parent, head]).value
+    change_tokens = [token for token in changes.split("\0") if token]
+    pathspecs_by_status = {}
+    for status, path in zip(change_tokens[0::2], change_tokens[1::2]):
+        # Paths are relative to the top of the repository, and must be taken literally
+        pathspecs_by_status.setdefault(status, []).append(":(top,literal)" + path)
+    added_pathspecs = pathspecs_by_status.pop("A", [])
+    restored_pathspecs = [pathspec for pathspecs in pathspecs_by_status.values() for pathspec in pathspecs]
+
+    if added_pathspecs or restored_pathspecs:
+        local_changes_result = run_command(
+            ["git", "diff", "--quiet", head, "--"] + added_pathspecs + restored_pathspecs, allow_failures=True)
+        if not local_changes_result.ok:
+            return ErrorResult(("bumped_files_have_local_changes", "Files changed by the bump commit have local changes. Commit or stash them first."))
+    if restored_pathspecs:
+        run_command(["git", "checkout", parent, "--"] + restored_pathspecs)
+    if added_pathspecs:
+        run_command(["git", "rm", "-q", "-f", "--"] + added_pathspecs)
+
+    ref_update_result = run_command(["git", "update-ref", "-m", reflog_message, "HEAD", parent, head], allow_failures=True)
+    if not ref_update_result.ok:
+        return ErrorResult(("other", "Git failed moving the branch to the previous commit."))
+    return OkResult()
+
+
+def git_undo_bump_tag(bumped_version, tag_template="v{version}"):
+    tag = tag_template.format(version=bumped_version)
+    if not vcs.delete_tag(tag):
         return ErrorResult(f"Could not delete tag '{tag}'. Did it exist?")
     return OkResult()
 
 
+# Asynchronous pipeline ########################################################
+
+
+async def async_bump(args, config, replacements, commit_message, tags, jobs=None, occurrence_index=None,
+                     expected_versions=(), expected_head=None):
+    # Same as `replace_in_files` followed by `git_bump`, but running the Git work that doesn't depend on the rewritten
+    # files while they're being staged, and adding each file to the index as soon as it's moved into place. Wall time
+    # then gets close to that of the slowest stage, rather than the sum of all of them.
+    import asyncio
+    import concurrent.futures
+    import tempfile
+    git_commit_requested, git_tag_requested, git_backend = git_bump_settings(args, config)
+    loop = asyncio.get_running_loop()
+    modified_files = []
+    applies = []
+
+    async def checked_file_replaces():
+        # Nothing is changed, on disk or in Git, until all files have been staged successfully and nothing moved since
+        # the bump started
+        stage_results = await asyncio.gather(*stages)
+        check_unchanged_since_start(expected_versions, expected_head, args.get("config_cache"))
+        staged_file_replaces = checked_staged_file_replaces(stage_results)
+        if git_commit_requested:
+            logger.log("Committing changes to Git.")
+        return staged_file_replaces
+
+    async def rewritten_files():
+        # NUL-terminated paths for `git update-index -z --stdin`, in the order files get moved into place
+        staged_file_replaces = await checking
+        applies.extend(
+            loop.run_in_executor(executor, staged_file_replace.apply, occurrence_index)
+            for staged_file_replace in staged_file_replaces
+        )
+        for apply in asyncio.as_completed(applies):
+            file_path = await apply
+            modified_files.append(file_path)
+            yield file_path + "\0"
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        stages = [
+            loop.run_in_executor(executor, stage_replacements_for_file, replacements_for_file, occurrence_index)
+            for replacements_for_file in group_replacements_by_file(replacements)
+        ]
+        checking = asyncio.ensure_future(checked_file_replaces())
+        try:
+            if not git_commit_requested:
+                async for _ in rewritten_files():
+                    pass
+            elif git_backend == "plumbing":
+                with tempfile.TemporaryDirectory(prefix="bumpytrack-") as temp_dir:
+                    temp_index_env = git_temp_index_env(temp_dir)
+                    await run_command_async(git_read_tree_command(expected_head), env=temp_index_env)
+                    await run_command_async(["git", "update-index", "--add", "-z", "--stdin"],
+                                            input=rewritten_files(), env=temp_index_env)
+                    tree = (await run_command_async(["git", "write-tree"], env=temp_index_env)).value
+            else:
+                await checking  # The index is left alone too unless the bump goes on
+                await run_command_async(["git", "reset", "HEAD"])
+                await run_command_async(["git", "update-index", "--add", "-z", "--stdin"], input=rewritten_files())
+        except BaseException:
+            # Let running work finish before leaving, and clean up whatever was staged but not applied
+            stage_results = await asyncio.gather(*stages, return_exceptions=True)
+            await asyncio.gather(checking, *applies, return_exceptions=True)
+            discard_staged_file_replaces(stage_results)
+            raise
+
+    if occurrence_index:
+        occurrence_index.save()
+
+    if not git_commit_requested:
+        # Only tagging, if anything, which needs no files
+        return modified_files, git_bump(args, config, modified_files, commit_message, tags)
+
+    if git_tag_requested:
+        logger.log("Adding version tag to Git.")
+    target = None
+    if git_backend == "plumbing":
+        target = git_commit_tree(tree, expected_head, commit_message)
+        git_update_refs(expected_head, target, commit_message, tags if git_tag_requested else ())
+        git_update_index(modified_files)
+    else:
+        run_command(["git", "commit", "-m", commit_message])
+        for tag in tags if git_tag_requested else ():
+            git_bump_tag(tag)
+
+    log_spawned_processes()
+    return modified_files, target
+
+
+# Backends #####################################################################
+
+
+class LocalFileSystem(object):
+    # The files bumps read and write, as they are on disk. Bumps on it take the optimized paths, streaming big files and
+    # writing them in parallel, but everything else goes through here.
+
+    def exists(self, path):
+        return os.path.isfile(path)
+
+    def read_bytes(self, path):
+        with open(path, "rb") as file:
+            return file.read()
+
+    def write_bytes(self, path, data):
+        target_path = os.path.realpath(path)
+        _, temp_path, _, _ = write_temp_file(target_path, lambda source, destination: destination.write(data))
+        os.replace(temp_path, target_path)
+
+    def remove(self, path):
+        os.remove(path)
+
+    def glob(self, pattern):
+        import glob
+        return [path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path)]
+
+
+class InMemoryFileSystem(object):
+    # Files kept in memory, by path. Files neither written nor removed are read from `base`, if given, so that it can
+    # stand in front of the files on disk without ever changing them.
+
+    def __init__(self, files=None, base=None):
+        self.files = {os.path.normpath(path): data for path, data in (files or {}).items()}  # None once removed
+        self.base = base
+
+    def exists(self, path):
+        path = os.path.normpath(path)
+        if path in self.files:
+            return self.files[path] is not None
+        return bool(self.base and self.base.exists(path))
+
+    def read_bytes(self, path):
+        path = os.path.normpath(path)
+        if self.files.get(path) is not None:
+            return self.files[path]
+        if path not in self.files and self.base:
+            return self.base.read_bytes(path)
+        raise FileNotFoundError(f"No such file: '{path}'")
+
+    def write_bytes(self, path, data):
+        self.files[os.path.normpath(path)] = bytes(data)
+
+    def remove(self, path):
+        if not self.exists(path):
+            raise FileNotFoundError(f"No such file: '{path}'")
+        self.files[os.path.normpath(path)] = None
+
+    def glob(self, pattern):
+        import fnmatch
+        paths = set(self.base.glob(pattern)) if self.base else set()
+        paths.update(path for path in self.files if fnmatch.fnmatch(path, os.path.normpath(pattern)))
+        return [path for path in paths if self.exists(path)]
+
+
+class GitVCS(object):
+    # What bumps and undos need from version control, done by running Git. The plumbing backend and the asynchronous
+    # pipeline drive Git directly instead, since they are ways of running it faster.
+
+    def head(self):
+        return git_head()
+
+    def commit(self, paths, message):
+        git_bump_commit(paths, message)
+        return None  # Not known without asking Git again
+
+    def tag(self, name):
+        git_bump_tag(name)
+
+    def last_commit_message(self):
+        return git_last_commit_message()
+
+    def reset_last_commit(self):
+        # Also restores the working tree. Returns whether it worked.
+        return run_command(["git", "reset", "--hard", "HEAD~1"], allow_failures=True).ok
+
+    def delete_tag(self, name):
+        return run_command(["git", "tag", "-d", name], allow_failures=True).ok
+
+    def ignored_paths(self, paths):
+        return git_ignored_paths(paths)
+
+
+class InMemoryVCS(object):
+    # Commits and tags kept in memory, committing files from `file_system`. Each commit is an (id, message, files)
+    # tuple, `files` being the contents of all the files committed so far, by path. Starts from commit `head`, with no
+    # files, if given.
+
+    def __init__(self, file_system, head=None):
+        self.file_system = file_system
+        self.commits = [(head, None, {})] if head else []
+        self.tags = {}
+
+    def head(self):
+        return self.commits[-1][0] if self.commits else None
+
+    def commit(self, paths, message):
+        files = dict(self.commits[-1][2]) if self.commits else {}
+        files.update((os.path.normpath(path), self.file_system.read_bytes(path)) for path in paths)
+        commit_id = f"{len(self.commits) + 1:040x}"
+        self.commits.append((commit_id, message, files))
+        return commit_id
+
+    def tag(self, name):
+        if not self.commits:
+            fail("There's no commit to tag.", GitError)
+        if name in self.tags:
+            fail(f"Tag '{name}' already exists.", GitError)
+        self.tags[name] = self.head()
+
+    def last_commit_message(self):
+        return (self.commits[-1][1] or "") if self.commits else ""
+
+    def reset_last_commit(self):
+        # Restores the files changed by the last commit, leaving others alone
+        if len(self.commits) < 2:
+            return False
+        _, _, files = self.commits.pop()
+        parent_files = self.commits[-1][2]
+        for path, data in files.items():
+            if path not in parent_files:
+                self.file_system.remove(path)
+            elif parent_files[path] != data:
+                self.file_system.write_bytes(path, parent_files[path])
+        return True
+
+    def delete_tag(self, name):
+        return self.tags.pop(name, None) is not None
+
+    def ignored_paths(self, paths):
+        return set()
+
+
+file_system = LocalFileSystem()
+vcs = GitVCS()
+
+
+def using_local_backends():
+    return isinstance(file_system, LocalFileSystem) and isinstance(vcs, GitVCS)
+
+
+def require_local_backends(feature):
+    if not using_local_backends():
+        fail(f"{feature} needs the files on disk and Git.", ConfigError)
+
+
+# Caches #######################################################################
+
+
+def find_git_dir(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    while True:
+        dot_git_path = os.path.join(directory, ".git")
+        if os.path.isdir(dot_git_path):
+            return dot_git_path
+        if os.path.isfile(dot_git_path):  # Worktrees and submodules point to their actual Git dir
+            with open(dot_git_path, "r", encoding="utf-8") as file:
+                git_dir_line = file.readline().strip()
+            if git_dir_line.startswith("gitdir:"):
+                return os.path.join(directory, git_dir_line[len("gitdir:"):].strip())
+        parent_directory = os.path.dirname(directory)
+        if parent_directory == directory:
+            return None
+        directory = parent_directory
+
+
+def cache_dir_for(path):
+    # Caches live in the Git dir of the repository `path` belongs to, unless configured otherwise
+    if os.environ.get("BUMPYTRACK_CACHE_DIR"):
+        return os.environ["BUMPYTRACK_CACHE_DIR"]
+    git_dir = find_git_dir(path)
+    if git_dir:
+        return os.path.join(git_dir, "bumpytrack")
+    user_cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(user_cache_dir, "bumpytrack")
+
+
+def read_json_cache(cache_path):
+    import json
+    try:
+        with open(cache_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None  # Missing or corrupt caches are just rebuilt
+
+
+def write_json_cache(cache_path, data):
+    # Written to a temporary file first, so that concurrent readers never see a partially written cache
+    import json
+    import tempfile
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), prefix=".tmp-")
+        try:
+            with os.fdopen(temp_fd, "w", encoding="utf-8") as file:
+                file.write(json.dumps(data))  # Much faster than `json.dump` for big caches
+            os.replace(temp_path, cache_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    except (OSError, TypeError, ValueError) as error:  # Also values not serializable to JSON, like TOML datetimes
+        logger.log_verbose(f"Could not write cache '{cache_path}': {error}")
+
+
+class ConfigCache(object):
+    # Resolved configs, keyed by config file path and validated by the file's mtime, size and content hash
+    FORMAT_VERSION = 1
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        cache = read_json_cache(cache_path)
+        if not cache or cache.get("format_version") != self.FORMAT_VERSION:
+            cache = {"format_version": self.FORMAT_VERSION, "entries": {}}
+        self._cache = cache
+        self._dirty = False
+
+    @staticmethod
+    def _key(config_file_stat, config_file_contents):
+        import hashlib
+        return [config_file_stat.st_mtime_ns, config_file_stat.st_size, hashlib.sha256(config_file_contents).hexdigest()]
+
+    def get(self, config_path, config_file_stat, config_file_contents):
+        entry = self._cache["entries"].get(os.path.abspath(config_path))
+        if entry is None or entry["key"][:2] != [config_file_stat.st_mtime_ns, config_file_stat.st_size]:
+            return None
+        if entry["key"] != self._key(config_file_stat, config_file_contents):
+            return None
+        return entry["config"]
+
+    def put(self, config_path, config_file_stat, config_file_contents, config):
+        self._cache["entries"][os.path.abspath(config_path)] = {
+            "key": self._key(config_file_stat, config_file_contents),
+            "config": config,
+        }
+        self._dirty = True
+
+    def save(self):
+        if self._dirty:
+            write_json_cache(self.cache_path, self._cache)
+            self._dirty = False
+
+
+class OccurrenceIndex(object):
+    # Offsets of the version strings in each file, as left by the last bump, so that the next one can patch them
+    # without searching. Entries are only valid while the file's size and mtime stay the same, and so does a hash of
+    # the bytes around each occurrence, which also catches edits the mtime doesn't tell about. Changes further away
+    # from the occurrences than `CONTEXT_SIZE` bytes are only noticed through the size and mtime.
+    FORMAT_VERSION = 3
+    CONTEXT_SIZE = 64
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        cache = read_json_cache(cache_path)
+        if not cache or cache.get("format_version") != self.FORMAT_VERSION:
+            cache = {"format_version": self.FORMAT_VERSION, "entries": {}}
+        self._cache = cache
+        self._dirty = False
+
+    def get(self, file_path, file_stat, searches):
+        # Returns the offsets of each of the searched byte strings, or None unless all of them are known
+        entry = self._cache["entries"].get(file_path)
+        if entry is None or [entry["size"], entry["mtime_ns"]] != [file_stat.st_size, file_stat.st_mtime_ns]:
+            return None
+        offsets = {search: entry["occurrences"].get(search.decode("utf-8")) for search in searches}
+        if not all(offsets.values()) or entry["context_hash"] != self.context_hash(file_path, offsets):
+            return None
+        return offsets
+
+    def update(self, file_path, file_stat, offsets):
+        self._cache["entries"][file_path] = {
+            "size": file_stat.st_size,
+            "mtime_ns": file_stat.st_mtime_ns,
+            "occurrences": {search.decode("utf-8"): search_offsets for search, search_offsets in offsets.items()},
+            "context_hash": self.context_hash(file_path, offsets),
+        }
+        self._dirty = True
+
+    def context_hash(self, file_path, offsets):
+        # Hash of the occurrences and the bytes around them, read without going through the rest of the file
+        import hashlib
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as file:
+            for offset, length in sorted((offset, len(search)) for search in offsets for offset in offsets[search]):
+                start = max(0, offset - self.CONTEXT_SIZE)
+                file.seek(start)
+                digest.update(file.read(offset + length + self.CONTEXT_SIZE - start))
+        return digest.hexdigest()
+
+    def save(self):
+        if self._dirty:
+            write_json_cache(self.cache_path, self._cache)
+            self._dirty = False
+
+
+def occurrence_index_for(config_path):
+    return OccurrenceIndex(os.path.join(cache_dir_for(config_path), "occurrences.json"))
+
+
+def git_tags_fingerprint(git_dir):
+    # Changes whenever tags are added or removed, so that Git doesn't need to be asked for them when it didn't. Adding
+    # or removing a loose ref changes the modification time of its directory, and packing refs rewrites packed-refs.
+    # None if refs aren't stored as plain files.
+    common_dir = git_dir
+    common_dir_path = os.path.join(git_dir, "commondir")  # In worktrees, refs are shared with the main repository
+    if os.path.isfile(common_dir_path):
+        with open(common_dir_path, "r", encoding="utf-8") as file:
+            common_dir = os.path.join(git_dir, file.read().strip())
+    tags_dir = os.path.join(common_dir, "refs", "tags")
+    if not os.path.isdir(tags_dir):
+        return None
+
+    fingerprint = []
+    try:
+        packed_refs_stat = os.stat(os.path.join(common_dir, "packed-refs"))
+        fingerprint.append(["packed-refs", packed_refs_stat.st_size, packed_refs_stat.st_mtime_ns])
+    except OSError:
+        pass  # Nothing packed yet
+    for directory, _, _ in os.walk(tags_dir):
+        fingerprint.append([os.path.relpath(directory, tags_dir), os.stat(directory).st_mtime_ns])
+    return fingerprint
+
+
+class TagIndex(object):
+    # Versions tagged in the repository, sorted by precedence. Tags are only listed again after refs change on disk,
+    # and then only the new ones are parsed and inserted.
+    FORMAT_VERSION = 1
+    MAX_INSERTIONS = 64  # Beyond this, it's faster to sort everything again
+
+    def __init__(self, cache_path, git_dir, tag_template):
+        self.cache_path = cache_path
+        self.git_dir = git_dir
+        self.tag_template = tag_template
+        self.tag_prefix, _, self.tag_suffix = tag_template.partition("{version}")
+        cache = read_json_cache(cache_path)
+        if not cache or [cache.get("format_version"), cache.get("git_dir"), cache.get("tag_template")] != \
+                [self.FORMAT_VERSION, git_dir, tag_template]:
+            cache = {
+                "format_version": self.FORMAT_VERSION,
+                "git_dir": git_dir,
+                "tag_template": tag_template,
+                "fingerprint": None,
+                "versions": [],
+            }
+        self._cache = cache
+
+    def tag_for(self, version):
+        return self.tag_template.format(version=version)
+
+    def versions(self):
+        # Version strings, from lowest to highest precedence
+        fingerprint = git_tags_fingerprint(self.git_dir) if self.git_dir else None
+        if fingerprint is None or fingerprint != self._cache["fingerprint"]:
+            self._update(fingerprint)
+        return self._cache["versions"]
+
+    def _update(self, fingerprint):
+        tags_pattern = "refs/tags/" + (self.tag_prefix + "*" if self.tag_prefix else "")
+        tags = run_command(["git", "for-each-ref", "--format=%(refname:strip=2)", tags_pattern]).value.splitlines()
+        if self.tag_suffix:
+            tagged_version_strs = {
+                tag[len(self.tag_prefix):-len(self.tag_suffix)]
+                for tag in tags
+                if tag.endswith(self.tag_suffix) and len(tag) > len(self.tag_prefix) + len(self.tag_suffix)
+            }
+        else:
+            # Tags already start with the prefix, as asked to Git. Slicing is all that's needed for the common case.
+            prefix_length = len(self.tag_prefix)
+            tagged_version_strs = {tag[prefix_length:] for tag in tags}
+
+        versions = [version_str for version_str in self._cache["versions"] if version_str in tagged_version_strs]
+        new_version_strs = tagged_version_strs.difference(versions)
+        new_versions = [version for version in parse_versions(new_version_strs) if version is not None]
+        if len(new_versions) > self.MAX_INSERTIONS:
+            versions = [str(version) for version in sort_versions(versions + [str(version) for version in new_versions])]
+        else:
+            for new_version in new_versions:
+                # Binary search, parsing only the versions compared with
+                low, high = 0, len(versions)
+                while low < high:
+                    middle = (low + high) // 2
+                    if parse_version(versions[middle]).sort_key <= new_version.sort_key:
+                        low = middle + 1
+                    else:
+                        high = middle
+                versions.insert(low, str(new_version))
+
+        self._cache["fingerprint"] = fingerprint
+        self._cache["versions"] = versions
+        write_json_cache(self.cache_path, self._cache)
+
+
+def tag_index_for(config_path, tag_template):
+    return TagIndex(os.path.join(cache_dir_for(config_path), "tags.json"), find_git_dir(config_path), tag_template)
+
+
+config_caches = {}  # One per cache path, shared by all configs using it
+
+
+def config_cache_for(config_path):
+    cache_path = os.path.join(cache_dir_for(config_path), "config.json")
+    if cache_path not in config_caches:
+        config_caches[cache_path] = ConfigCache(cache_path)
+    return config_caches[cache_path]
+
+
+def save_config_caches():
+    for config_cache in config_caches.values():
+        config_cache.save()
+
+
+# Concurrency ##################################################################
+
+
+def lock_path_for(path):
+    # Always in the Git dir, wherever caches are, so that all bumps of a checkout see the same lock
+    git_dir = find_git_dir(path)
+    if git_dir:
+        return os.path.join(git_dir, "bumpytrack", "lock")
+    # Not in a repository, so the cache dir is shared with others
+    directory = os.path.dirname(os.path.realpath(path))
+    return os.path.join(cache_dir_for(path), "locks", directory.replace(os.sep, "%").replace(":", "%"))
+
+
+def try_lock_file(file):
+    try:
+        import fcntl
+    except ImportError:  # Windows
+        import msvcrt
+        file.seek(0)
+        try:
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+    try:
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def unlock_file(file):
+    try:
+        import fcntl
+    except ImportError:  # Windows
+        import msvcrt
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+    fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class RepoLock(object):
+    # Serializes changes to the same repository across processes, by locking a file next to its caches. It's advisory,
+    # so only bumpytrack respects it. Gives up after `timeout` seconds, if given.
+    MAX_POLL_INTERVAL = 0.5
+
+    def __init__(self, path, timeout=None):
+        self.lock_path = lock_path_for(path)
+        self.timeout = timeout
+        self._file = None
+
+    def acquire(self):
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        self._file = open(self.lock_path, "a")
+        start = time.monotonic()
+        poll_interval = 0.01
+        while not try_lock_file(self._file):
+            if self.timeout is not None and time.monotonic() - start >= self.timeout:
+                self._file.close()
+                fail(f"Timed out after {self.timeout}s waiting for another bump of this repository to finish.",
+                     ConcurrentBumpError)
+            if poll_interval == 0.01:
+                logger.log("Waiting for another bump of this repository to finish...")
+            time.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, self.MAX_POLL_INTERVAL)
+
+    def release(self):
+        unlock_file(self._file)
+        self._file.close()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *_exc_info):
+        self.release()
+        return False
+
+
+BUMP_ATTEMPTS = 3
+DEFAULT_LOCK_TIMEOUT = 300
+
+
+def changes_repository(args):
+    return not args.get("dry_run") and args.get("command") not in TAG_HISTORY_COMMANDS
+
+
+def run_locked(args, config_path, function):
+    # Loads the config and runs `function(args, config, config_path)`, holding the repository lock if it changes
+    # anything. Should a version still change in the meantime (by an older bumpytrack, or another machine sharing the
+    # checkout), it's run again from the new version, unless versions were forced.
+    lock = RepoLock(config_path, user_request(None, args.get("lock_timeout"), DEFAULT_LOCK_TIMEOUT)) \
+        if changes_repository(args) and using_local_backends() else None
+    attempts = 1 if args.get("current_version") or args.get("new_version") else BUMP_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        if lock:
+            with tracer.span("lock"):
+                lock.acquire()
+        try:
+            config = load_config(config_path, args.get("config_cache"))
+            save_config_caches()
+            return function(args, config, config_path)
+        except ConcurrentBumpError as error:
+            if attempt == attempts:
+                raise
+            logger.log(f"{error} Trying again.")
+        finally:
+            if lock:
+                lock.release()
+
+
+def check_versions_unchanged(expected_versions, use_cache=False):
+    # The compare part of compare-and-swap: right before files are written, configs must still have the versions the
+    # new ones were computed from. Takes (config path, version) pairs.
+    for config_path, expected_version in expected_versions:
+        found_version = load_config(config_path, use_cache).get("current_version")
+        if found_version != expected_version:
+            fail(f"Version in '{config_path}' changed from '{expected_version}' to '{found_version}' while bumping.",
+                 ConcurrentBumpError)
+
+
+def check_head_unchanged(expected_head):
+    # Like `check_versions_unchanged`, for the commit the bump commit goes on top of
+    head = vcs.head()
+    if head != expected_head:
+        fail(f"HEAD moved from '{expected_head}' to '{head}' while bumping.", ConcurrentBumpError)
+
+
+def check_unchanged_since_start(expected_versions, expected_head=None, use_cache=False):
+    # Run right before files are written, so that a bump finding anything changed leaves them untouched and is retried
+    check_versions_unchanged(expected_versions, use_cache)
+    if expected_head:
+        check_head_unchanged(expected_head)
+
+
+# Changelogs ##################################################################
+
+
+CHANGELOG_GROUPS = (
+    ("breaking", "Breaking changes"),
+    ("feat", "Features"),
+    ("fix", "Bug fixes"),
+    ("perf", "Performance"),
+    ("other", "Other changes"),
+)
+CONVENTIONAL_COMMIT_PATTERN = r"^(?P<type>[A-Za-z]+)(?:\((?P<scope>[^()]*)\))?(?P<breaking>!)?: *(?P<description>.+)$"
+BREAKING_CHANGE_FOOTER_PATTERN = r"^BREAKING[ -]CHANGE: "
+HIDDEN_COMMIT_TYPES = ("build", "chore", "ci", "docs", "refactor", "style", "test")
+BUMP_COMMIT_PREFIXES = ("Bumping version: ", "Bumping versions:")
+
+
+def git_log_commits(revision_range):
+    # Yields the (short hash, subject, body) of each commit in `revision_range`, newest first, as Git outputs them.
+    # Long histories are never held in memory, and Git is stopped if the generator is closed before the end. Its
+    # errors go to a temporary file, since a pipe read only at the end could fill up and block Git.
+    import subprocess
+    import tempfile
+    command_tokens = ["git", "log", "--no-merges", "--format=%x1e%h%x09%s%n%b", revision_range]
+    with tracer.span("git log", "subprocess", argv=command_tokens) as span, tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command_tokens, stdout=subprocess.PIPE, stderr=stderr, encoding="utf-8",
+                                   errors="replace")
+        finished = False
+        try:
+            commit = None
+            for line in process.stdout:
+                if line.startswith("\x1e"):
+                    if commit:
+                        yield commit[0], commit[1], "".join(commit[2])
+                    short_hash, _, subject = line[1:].rstrip("\n").partition("\t")
+                    commit = (short_hash, subject, [])
+                elif commit:
+                    commit[2].append(line)
+            if commit:
+                yield commit[0], commit[1], "".join(commit[2])
+            finished = True
+        finally:
+            if not finished:
+                process.kill()
+            process.stdout.close()
+            span.args["exit_code"] = process.wait()
+            stderr.seek(0)
+            errors = stderr.read().decode("utf-8", "replace").strip()
+    if process.returncode != 0:
+        fail(f"Failed to execute '{' '.join(command_tokens)}'. Output was:\n\n{errors}\n", GitError)
+
+
+def commit_patterns():
+    import re
+    return re.compile(CONVENTIONAL_COMMIT_PATTERN), re.compile(BREAKING_CHANGE_FOOTER_PATTERN, re.MULTILINE)
+
+
+def conventional_commit(subject, body, patterns):
+    # The (type, scope, description, breaking) of a commit following the conventional commits spec, or None
+    conventional_commit_pattern, breaking_change_footer_pattern = patterns
+    match = conventional_commit_pattern.match(subject)
+    if not match:
+        return None
+    breaking = bool(match.group("breaking") or breaking_change_footer_pattern.search(body))
+    return match.group("type").lower(), match.group("scope"), match.group("description"), breaking
+
+
+def changelog_entry(short_hash, subject, body, patterns):
+    # The (group, text) of a commit in the changelog, or None if it shouldn't be in it
+    if subject.startswith(BUMP_COMMIT_PREFIXES):
+        return None
+    commit = conventional_commit(subject, body, patterns)
+    if not commit:
+        return "other", f"{subject} ({short_hash})"
+    commit_type, scope, description, breaking = commit
+    if commit_type in HIDDEN_COMMIT_TYPES and not breaking:
+        return None
+    group = "breaking" if breaking else commit_type if commit_type in dict(CHANGELOG_GROUPS) else "other"
+    scope = f"**{scope}:** " if scope else ""
+    return group, f"{scope}{description} ({short_hash})"
+
+
+def changelog_entries(revision_range):
+    # Changelog texts of the commits in `revision_range`, by group
+    patterns = commit_patterns()
+    entries = {}
+    for short_hash, subject, body in git_log_commits(revision_range):
+        entry = changelog_entry(short_hash, subject, body, patterns)
+        if entry:
+            entries.setdefault(entry[0], []).append(entry[1])
+    return entries
+
+
+def changelog_section(version, entries, date):
+    lines = [f"## {version} ({date})", ""]
+    for group, title in CHANGELOG_GROUPS:
+        if entries.get(group):
+            lines += [f"### {title}", ""] + [f"- {text}" for text in entries[group]] + [""]
+    if not entries:
+        lines += ["No notable changes.", ""]
+    return "\n".join(lines)
+
+
+def stage_changelog_update(file_path, section):
+    with tracer.span("changelog_update", "io", path=file_path) as span:
+        try:
+            result = OkResult(_stage_changelog_update(file_path, section))
+        except OSError as error:
+            result = ErrorResult(f"Failed reading file '{file_path}' or writing next to it: {error.strerror}.")
+        if result.ok:
+            span.args.update(result.value.stats)
+        return result
+
+
+def insert_changelog_section(source, destination, section_bytes):
+    # Copies the changelog adding `section_bytes` on top, below its title if it has one. An empty changelog gets one.
+    import shutil
+    first_line = source.readline()
+    if not first_line:
+        destination.write(b"# Changelog\n\n" + section_bytes)
+        return
+    if first_line.startswith(b"# "):
+        destination.write(first_line.rstrip(b"\r\n") + b"\n\n")
+        first_line = source.readline()
+        while first_line.strip() == b"" and first_line:
+            first_line = source.readline()
+    destination.write(section_bytes + b"\n" + first_line)
+    shutil.copyfileobj(source, destination)
+
+
+def _stage_changelog_update(file_path, section):
+    # Adds `section` to the changelog, creating it if missing. Like version replacements, the file is only written
+    # when the staged update is applied.
+    target_path = os.path.realpath(file_path)
+    _, temp_path, bytes_read, bytes_written = write_temp_file(
+        target_path, lambda source, destination: insert_changelog_section(source, destination, section.encode("utf-8")))
+    stats = {"bytes_read": bytes_read, "bytes_written": bytes_written}
+    return StagedFileReplace(file_path, target_path, stats, None, temp_path=temp_path)
+
+
+def changelog_cache_path(config_path):
+    return os.path.join(cache_dir_for(config_path), "changelog.json")
+
+
+def changelog_last_commit(config_path, changelog_path):
+    # Bump commit that last added changes to the changelog, as cached when it was created
+    cache = read_json_cache(changelog_cache_path(config_path)) or {}
+    return cache.get("last_commits", {}).get(os.path.realpath(changelog_path))
+
+
+def save_changelog_last_commit(config_path, changelog_path, commit):
+    cache = read_json_cache(changelog_cache_path(config_path)) or {}
+    cache.setdefault("last_commits", {})[os.path.realpath(changelog_path)] = commit
+    write_json_cache(changelog_cache_path(config_path), cache)
+
+
+def git_is_ancestor(ancestor, commit):
+    return run_command(["git", "merge-base", "--is-ancestor", ancestor, commit], allow_failures=True).ok
+
+
+def git_tagged_commit(tag):
+    tag_result = run_command(["git", "rev-parse", "-q", "--verify", f"refs/tags/{tag}^{{commit}}"], allow_failures=True)
+    return tag_result.value if tag_result.ok else None
+
+
+def changelog_start(config_path, changelog_path, previous_tag, head):
+    # Where the changes to add to the changelog start: the most recent of the previous version's tag and the last
+    # commit already in the changelog, so that only new commits are read. None if there's neither.
+    tagged_commit = git_tagged_commit(previous_tag)
+    last_commit = changelog_last_commit(config_path, changelog_path)
+    if last_commit and not git_is_ancestor(last_commit, head):
+        last_commit = None  # E.g. the bump that added it was undone
+    if tagged_commit and last_commit:
+        return last_commit if git_is_ancestor(tagged_commit, last_commit) else tagged_commit
+    return tagged_commit or last_commit
+
+
+def changelog_update_for(config_path, changelog_path, previous_tag, new_version):
+    # A replacement config adding the changes since the previous version to the changelog
+    import datetime
+    head = git_head()
+    entries = {}
+    if head:
+        start = changelog_start(config_path, changelog_path, previous_tag, head)
+        entries = changelog_entries(f"{start}..{head}" if start else head)
+    logger.log(f"Found {sum(len(texts) for texts in entries.values())} changes to add to '{changelog_path}'.")
+    section = changelog_section(new_version, entries, datetime.date.today().isoformat())
+    return {"path": changelog_path, "changelog_section": section}
+
+
+# Automatic bumps ##############################################################
+
+
+AUTO_BUMP_PARTS = ("patch", "minor", "major")  # From least to most significant
+
+
+def commit_bump_part(subject, body, patterns):
+    # The part a commit asks to bump: major for breaking changes, minor for features, and patch for anything else
+    commit = conventional_commit(subject, body, patterns)
+    if commit and commit[3]:
+        return "major"
+    if commit and commit[0] == "feat":
+        return "minor"
+    return "patch"
+
+
+def scan_bump_part(revision_range):
+    # The most significant part to bump for the commits in `revision_range`, or None if there are none, and whether
+    # a previous bump commit was reached. Reading stops there, or as soon as a breaking change is found, since nothing
+    # can change the outcome after that.
+    patterns = commit_patterns()
+    part = None
+    commits = git_log_commits(revision_range)
+    try:
+        for _, subject, body in commits:
+            if subject.startswith(BUMP_COMMIT_PREFIXES):
+                return part, True
+            commit_part = commit_bump_part(subject, body, patterns)
+            if part is None or AUTO_BUMP_PARTS.index(commit_part) > AUTO_BUMP_PARTS.index(part):
+                part = commit_part
+            if part == "major":
+                break
+    finally:
+        commits.close()
+    return part, False
+
+
+def auto_bump_cache_path(config_path):
+    return os.path.join(cache_dir_for(config_path), "auto_bump.json")
+
+
+def detect_bump_part(config_path, previous_tag):
+    # Picks the part to bump from the commits since the previous version: those after its tag, or after the last bump
+    # commit if it wasn't tagged. The last scanned commit and the part found are cached, so that next runs only read
+    # the commits made since, and nothing at all if there are none.
+    require_local_backends("Picking the part to bump automatically")
+    head = git_head()
+    start = git_tagged_commit(previous_tag)
+    cache = read_json_cache(auto_bump_cache_path(config_path)) or {}
+    cache_key = os.path.realpath(config_path)
+    cached = cache.get(cache_key)
+    if cached and cached.get("start") != start:
+        cached = None  # The previous version is tagged elsewhere now
+
+    if not head:
+        part = None
+    elif cached and cached["last_commit"] == head:
+        logger.log_verbose(f"Using the part to bump found up to '{head}'.")
+        part = cached["part"]
+    else:
+        scan_start = start
+        if cached and git_is_ancestor(cached["last_commit"], head):
+            scan_start = cached["last_commit"]
+        else:
+            cached = None
+        part, reached_previous_bump = scan_bump_part(f"{scan_start}..{head}" if scan_start else head)
+        if cached and cached["part"] and not reached_previous_bump:
+            part = cached["part"] if part is None else max(part, cached["part"], key=AUTO_BUMP_PARTS.index)
+        cache[cache_key] = {"start": start, "last_commit": head, "part": part}
+        write_json_cache(auto_bump_cache_path(config_path), cache)
+
+    if part is None:
+        fail("No commits since the previous version, so there's nothing to bump.", VersionError)
+    return part
+
+
 # High-level tasks / use-cases #################################################
 
 
-def do_bump(args, config, config_path):
-    # Get current version
+class BumpResult(object):
+    # What a bump did. `commit` is None if no commit was created, and `timings` holds the total seconds spent in each
+    # step, once known.
+    def __init__(self, current_version, new_version, modified_files, commit, tags, timings=None):
+        self.current_version = current_version
+        self.new_version = new_version
+        self.modified_files = modified_files
+        self.commit = commit
+        self.tags = tags
+        self.timings = timings
+
+    def __repr__(self):
+        return f"BumpResult({self.current_version!r} → {self.new_version!r}, commit={self.commit!r}, tags={self.tags!r})"
+
+
+class UndoResult(object):
+    # What undoing a bump did. Undoing is best effort, so either the commit or the tag may be left.
+    def __init__(self, version, commit_undone, tag_removed, timings=None):
+        self.version = version
+        self.commit_undone = commit_undone
+        self.tag_removed = tag_removed  # Tag name, or None
+        self.timings = timings
+
+    def __repr__(self):
+        return f"UndoResult({self.version!r}, commit_undone={self.commit_undone!r}, tag_removed={self.tag_removed!r})"
+
+
+def get_current_version(args, config):
     current_version = args.get("current_version") or config.get("current_version")
     if not current_version:
-        fail("No way to obtain current version.")
-    logger.log(f"Current version: '{current_version}'.")
+        fail("No way to obtain current version.", ConfigError)
+    return current_version
 
-    # Get new version
+
+def get_new_version(args, current_version):
     if args.get("new_version"):
-        new_version = args.get("new_version")
+        return args.get("new_version")
     elif args.get("command"):  # We're now bumping, so command is the version "part" to bump
-        new_version = increment_version(current_version, args.get("command"))
+        return increment_version(current_version, args.get("command"))
     else:
-        fail("No way to obtain a new version.")
-    logger.log(f"New version: '{new_version}'.")
+        fail("No way to obtain a new version.", ConfigError)
 
-    # Replace version in config file and other configured files
-    logger.log("Replacing version string in files...")
-    file_replace_configs = config.get("file_replaces") or []
-    file_replace_configs.append({"path": config_path, "search_template": "current_version = \"{version}\""})
-    modified_files = []
-    for file_replace_config in file_replace_configs:
-        file_path = file_replace_config['path']
-        file_replace(file_replace_config, current_version, new_version)
-        modified_files.append(file_path)
 
-    # Git commit file changes
+def get_file_replace_configs(args, config, config_path, base_dir=None):
+    # Paths in the config are relative to `base_dir` if given, or to the current directory otherwise
+    file_replace_configs = config.get("file_replaces") or []
+    if base_dir is not None:
+        file_replace_configs = [relative_to_base_dir(file_replace_config, base_dir)
+                                for file_replace_config in file_replace_configs]
+    respect_gitignore = user_request(config.get("gitignore"), args.get("gitignore"), True)
+    file_replace_configs = expand_file_replace_configs(file_replace_configs, respect_gitignore)
+    config_file_replace_config = {"path": config_path, "search_template": "current_version = \"{version}\""}
+    if config.get("current_version_span"):
+        config_file_replace_config["span"] = config["current_version_span"]
+    file_replace_configs.append(config_file_replace_config)
+    return file_replace_configs
+
+
+def git_bump_settings(args, config):
     git_commit_requested = user_request(config.get("git_commit"), args.get("git_commit"), False)
-    if git_commit_requested:
-        logger.log("Committing changes to Git.")
-        git_bump_commit(modified_files, current_version, new_version)
-
-    # Git tag new version
     git_tag_requested = user_request(config.get("git_tag"), args.get("git_tag"), False)
-    if git_tag_requested:
-        logger.log("Adding version tag to Git.")
-        git_bump_tag(new_version)
+    git_backend = user_request(config.get("git_backend"), args.get("git_backend"), "porcelain")
+    if git_backend not in ("porcelain", "plumbing"):
+        fail(f"Git backend '{git_backend}' not recognized. Should be one of: porcelain or plumbing.", ConfigError)
+    return git_commit_requested, git_tag_requested, git_backend
+
+
+def git_push_settings(args, config):
+    git_push_requested = user_request(config.get("git_push"), args.get("git_push"), False)
+    git_remote = user_request(config.get("git_remote"), args.get("git_remote"), "origin")
+    return git_push_requested, git_remote
+
+
+def git_bump(args, config, modified_files, commit_message, tags, expected_head=None):
+    # Returns the new commit, if created and known without asking Git. The plumbing backend commits on top of
+    # `expected_head`, if given, failing if HEAD moved.
+    git_commit_requested, git_tag_requested, git_backend = git_bump_settings(args, config)
+    commit = None
+
+    if git_backend == "plumbing" and (git_commit_requested or git_tag_requested) and using_local_backends():
+        # Git commit file changes and tag new version at once
+        if git_commit_requested:
+            logger.log("Committing changes to Git.")
+        if git_tag_requested:
+            logger.log("Adding version tag to Git.")
+        commit = git_plumbing_bump(
+            modified_files,
+            commit_message if git_commit_requested else None,
+            tags if git_tag_requested else (),
+            expected_head,
+        )
+    else:
+        # Git commit file changes
+        if git_commit_requested:
+            logger.log("Committing changes to Git.")
+            commit = vcs.commit(modified_files, commit_message)
+
+        # Git tag new version
+        if git_tag_requested:
+            logger.log("Adding version tag to Git.")
+            for tag in tags:
+                vcs.tag(tag)
+
+    log_spawned_processes()
+    return commit
+
+
+def bump_base_head(args, config):
+    # The commit the bump commit goes on top of. Read before versions, so that anything committed meanwhile is noticed.
+    git_commit_requested, _, _ = git_bump_settings(args, config)
+    return vcs.head() if git_commit_requested and not args.get("dry_run") else None
+
+
+def replace_and_git_bump(args, config, config_path, replacements, commit_message, tags, expected_versions=(),
+                         expected_head=None):
+    # Replace versions in files, then commit, tag and push them in Git (as requested). Files are only written if
+    # configs still have the `expected_versions`, and the commit only created if HEAD didn't move meanwhile. Returns
+    # the modified files and the new commit, if known.
+    if args.get("dry_run"):
+        return preview_bump(args, config, replacements, commit_message, tags)
+
+    git_commit_requested, git_tag_requested, _ = git_bump_settings(args, config)
+    git_push_requested, git_remote = git_push_settings(args, config)
+    if not using_local_backends():
+        # Other backends only get the basics, one file at a time
+        if git_push_requested:
+            require_local_backends("Pushing")
+        with tracer.span("replace_in_file_system"):
+            modified_files = list(replace_in_file_system(
+                replacements, before_apply=lambda: check_unchanged_since_start(expected_versions, expected_head)))
+        with tracer.span("git_bump"):
+            return modified_files, git_bump(args, config, modified_files, commit_message, tags, expected_head)
+
+    jobs = user_request(config.get("jobs"), args.get("jobs"), None)
+    occurrence_index_requested = user_request(config.get("occurrence_index"), args.get("occurrence_index"), False)
+    occurrence_index = occurrence_index_for(config_path) if occurrence_index_requested else None
+    if user_request(config.get("async_pipeline"), args.get("async_pipeline"), False):
+        import asyncio
+        with tracer.span("async_bump"):
+            modified_files, commit = asyncio.run(async_bump(args, config, replacements, commit_message, tags, jobs,
+                                                            occurrence_index, expected_versions, expected_head))
+    else:
+        with tracer.span("replace_in_files"):
+            modified_files = replace_in_files(
+                replacements, jobs, occurrence_index,
+                before_apply=lambda: check_unchanged_since_start(expected_versions, expected_head,
+                                                                 args.get("config_cache")),
+            )
+
+        with tracer.span("git_bump"):
+            commit = git_bump(args, config, modified_files, commit_message, tags, expected_head)
+
+    if git_push_requested:
+        logger.log(f"Pushing to '{git_remote}'.")
+        with tracer.span("git_push"):
+            # Nothing is rebased unless a bump commit was created, so that only tagging never rewrites the branch
+            commit = git_push_bump(git_remote, tags if git_tag_requested else (), rebase=git_commit_requested) or commit
+        log_spawned_processes()
+    return modified_files, commit
+
+
+def preview_bump(args, config, replacements, commit_message, tags):
+    # Does the bump on in-memory backends standing in front of the actual ones, then tells what it did. So nothing is
+    # written, and Git is only asked about the current state.
+    global logger, file_system, vcs
+    preview_file_system = InMemoryFileSystem(base=file_system)
+    preview_vcs = InMemoryVCS(preview_file_system, head=vcs.head())
+    first_new_commit = len(preview_vcs.commits)
+    previous_backends = logger, file_system, vcs
+    logger, file_system, vcs = SilentLogger(), preview_file_system, preview_vcs
+    try:
+        done_by_path = replace_in_file_system(replacements)
+        git_bump(args, config, list(done_by_path), commit_message, tags)
+    finally:
+        logger, file_system, vcs = previous_backends
+
+    for file_path, done in done_by_path.items():
+        if isinstance(done, str):
+            logger.log(f"Would add to '{file_path}':\n\n{done}")
+        else:
+            for search, replace, count in done:
+                logger.log(f"Would replace {count} occurrences of '{search}' with '{replace}' in '{file_path}'.")
+    for _, message, _ in preview_vcs.commits[first_new_commit:]:
+        logger.log(f"Would commit changes to Git with message '{message}'.")
+    if preview_vcs.tags:
+        logger.log(f"Would add tags to Git: {', '.join(preview_vcs.tags)}.")
+    git_push_requested, git_remote = git_push_settings(args, config)
+    if git_push_requested:
+        logger.log(f"Would push to '{git_remote}' at once.")
+    return [], None
+
+
+def do_bump(args, config, config_path):
+    expected_head = bump_base_head(args, config)
+    with tracer.span("compute_versions"):
+        # Get current version
+        current_version = get_current_version(args, config)
+        logger.log(f"Current version: '{current_version}'.")
+
+        # Get new version, picking the part to bump if asked to
+        if args.get("command") == "auto" and not args.get("new_version"):
+            with tracer.span("detect_bump_part"):
+                part = detect_bump_part(config_path, get_tag_template(config).format(version=current_version))
+            logger.log(f"Part to bump: '{part}'.")
+            args = dict(args, command=part)
+        new_version = get_new_version(args, current_version)
+        logger.log(f"New version: '{new_version}'.")
+
+    # Replace version in config file and other configured files, then commit and tag in Git
+    logger.log("Replacing version string in files...")
+    with tracer.span("get_file_replace_configs"):
+        file_replace_configs = get_file_replace_configs(args, config, config_path)
+    replacements = [(file_replace_config, current_version, new_version) for file_replace_config in file_replace_configs]
+    changelog_path = user_request(config.get("changelog"), args.get("changelog"), None)
+    if changelog_path:
+        require_local_backends("Adding to a changelog")
+        with tracer.span("changelog"):
+            changelog_update = changelog_update_for(
+                config_path, changelog_path, get_tag_template(config).format(version=current_version), new_version)
+        replacements.append((changelog_update, current_version, new_version))
+    commit_message = bump_commit_message(current_version, new_version)
+    tags = [get_tag_template(config).format(version=new_version)]
+    expected_versions = [] if args.get("current_version") else [(config_path, current_version)]
+    modified_files, commit = replace_and_git_bump(args, config, config_path, replacements, commit_message, tags,
+                                                  expected_versions, expected_head)
+    git_commit_requested, git_tag_requested, _ = git_bump_settings(args, config)
+    if changelog_path and git_commit_requested and not args.get("dry_run"):
+        # The bump commit itself, so that it stops counting once undone
+        save_changelog_last_commit(config_path, changelog_path, commit or vcs.head())
+
+    return BumpResult(current_version, new_version, modified_files, commit, tags if git_tag_requested else [])
+
+
+def find_workspace_packages(root, respect_gitignore=True, use_cache=False):
+    # Returns a {package name: (config path, config)} dict with every package config found under `root`
+    import glob
+    config_paths = sorted(glob.glob(os.path.join(root, "**", "pyproject.toml"), recursive=True))
+    if respect_gitignore:
+        ignored_paths = git_ignored_paths(config_paths)
+        config_paths = [config_path for config_path in config_paths if config_path not in ignored_paths]
+
+    packages = {}
+    for config_path in config_paths:
+        config = load_config(config_path, use_cache)
+        if not config.get("current_version"):
+            continue  # Workspace-wide settings only, like the ones at the root of the workspace
+
+        package_dir = os.path.relpath(os.path.dirname(config_path), root).replace(os.sep, "/")
+        default_package_name = os.path.basename(os.path.abspath(root)) if package_dir == "." else package_dir
+        package_name = config.get("package_name") or default_package_name
+        if package_name in packages:
+            fail(f"Package name '{package_name}' is used by both '{packages[package_name][0]}' and '{config_path}'.", ConfigError)
+        packages[package_name] = (config_path, config)
+    save_config_caches()
+
+    return packages
+
+
+def do_workspace_bump(args, config, config_path):
+    if args.get("current_version") or args.get("new_version"):
+        fail("Versions can't be forced when bumping a workspace, since each package has its own.", ConfigError)
+    if user_request(config.get("changelog"), args.get("changelog"), None):
+        fail("Changelogs are not supported when bumping a workspace.", ConfigError)
+    if args.get("command") == "auto":
+        fail("Picking the part to bump automatically is not supported when bumping a workspace.", ConfigError)
+    require_local_backends("Bumping a workspace")
+
+    # Find packages to bump
+    root = os.path.dirname(config_path) or "."
+    respect_gitignore = user_request(config.get("gitignore"), args.get("gitignore"), True)
+    with tracer.span("find_workspace_packages"):
+        packages = find_workspace_packages(root, respect_gitignore, args.get("config_cache"))
+    selected_package_names = args.get("packages") or list(packages)
+    unknown_package_names = [name for name in selected_package_names if name not in packages]
+    if unknown_package_names:
+        fail(f"Packages not found in workspace: {', '.join(unknown_package_names)}.", ConfigError)
+    if not selected_package_names:
+        fail(f"No packages found in workspace '{root}'.", ConfigError)
+
+    # Get current and new versions of each package
+    expected_head = bump_base_head(args, config)
+    versions = {}
+    with tracer.span("compute_versions"):
+        for package_name in selected_package_names:
+            _, package_config = packages[package_name]
+            current_version = get_current_version({}, package_config)
+            new_version = get_new_version(args, current_version)
+            versions[package_name] = (current_version, new_version)
+            logger.log(f"Package '{package_name}': '{current_version}' → '{new_version}'.")
+
+    # Replace versions in all packages at once, so files of different packages are processed in parallel
+    logger.log("Replacing version string in files...")
+    replacements = []
+    with tracer.span("get_file_replace_configs"):
+        for package_name in selected_package_names:
+            package_config_path, package_config = packages[package_name]
+            package_dir = os.path.dirname(package_config_path)
+            current_version, new_version = versions[package_name]
+            for file_replace_config in get_file_replace_configs(args, package_config, package_config_path, package_dir):
+                replacements.append((file_replace_config, current_version, new_version))
+
+    # Git commit file changes and tag new versions, all at once
+    commit_message = "Bumping versions:\n\n" + "\n".join(
+        f"{package_name}: {current_version} → {new_version}"
+        for package_name, (current_version, new_version) in versions.items()
+    )
+    tags = [
+        WORKSPACE_TAG_TEMPLATE.format(package=package_name, version=new_version)
+        for package_name, (_, new_version) in versions.items()
+    ]
+    expected_versions = [
+        (packages[package_name][0], current_version) for package_name, (current_version, _) in versions.items()
+    ]
+    replace_and_git_bump(args, config, config_path, replacements, commit_message, tags, expected_versions,
+                         expected_head)
+
+
+def get_tag_template(config):
+    tag_template = config.get("tag_template") or DEFAULT_CONFIG["tag_template"]
+    if tag_template.count("{version}") != 1:
+        fail(f"Tag template '{tag_template}' should contain '{{version}}' exactly once.", ConfigError)
+    return tag_template
+
+
+def do_history(args, config, config_path):
+    tag_index = tag_index_for(config_path, get_tag_template(config))
+    for version in reversed(tag_index.versions()):
+        logger.log(tag_index.tag_for(version))
+
+
+def do_latest(args, config, config_path):
+    tag_index = tag_index_for(config_path, get_tag_template(config))
+    versions = tag_index.versions()
+    if not versions:
+        fail("No version tags found.", VersionError)
+
+    latest_version = versions[-1]
+    logger.log(f"Latest version: '{latest_version}' (tag '{tag_index.tag_for(latest_version)}').")
+    if parse_version(latest_version).prerelease:
+        latest_release = next(
+            (version_str for version_str in reversed(versions) if not parse_version(version_str).prerelease), None)
+        if latest_release:
+            logger.log(f"Latest release: '{latest_release}' (tag '{tag_index.tag_for(latest_release)}').")
+
+    # Versions the next bumps could take, since versions may have been tagged outside of this branch
+    current_version = args.get("current_version") or config.get("current_version") or latest_version
+    tagged_versions = set(versions)
+    next_free_versions = []
+    for part in ("major", "minor", "patch"):
+        next_version = increment_version(current_version, part)
+        while next_version in tagged_versions:
+            next_version = increment_version(next_version, part)
+        next_free_versions.append(f"{part} '{next_version}'")
+    logger.log(f"Next free versions from '{current_version}': {', '.join(next_free_versions)}.")
+
+
+def do_verify(args, config, config_path):
+    current_version = get_current_version(args, config)
+    tag_index = tag_index_for(config_path, get_tag_template(config))
+    versions = tag_index.versions()
+
+    drifts = []
+    if current_version not in versions:
+        drifts.append(f"Version '{current_version}' in config has no tag '{tag_index.tag_for(current_version)}'.")
+    if versions and parse_version(versions[-1]) > parse_version(current_version):
+        drifts.append(f"Version '{current_version}' in config is behind the latest tagged version '{versions[-1]}'.")
+    if drifts:
+        fail("\n".join(drifts), VersionError)
+    logger.log(f"Version '{current_version}' in config is tagged as '{tag_index.tag_for(current_version)}', and "
+               "it's the latest one.")
 
 
 def do_git_undo(args, config, config_path):
     # Get current version
     current_version = args.get("current_version") or config.get("current_version")
     if not current_version:
-        fail("No way to obtain current version")
+        fail("No way to obtain current version", ConfigError)
     logger.log(f"Undoing bump to version: '{current_version}'.")
 
-    # Undo bump git commit
-    git_undo_bump_commit_result = git_undo_bump_commit(current_version)
+    if args.get("dry_run"):
+        if not git_last_commit_is_bump_to(current_version):
+            fail("Can only undo bumps corresponding to the most recent commit.", GitError)
+        logger.log(f"Would undo the last commit and remove tag '{get_tag_template(config).format(version=current_version)}'.")
+        return UndoResult(current_version, False, None)
+
+    # Undo bump git commit. The plumbing backend only restores the files changed by the bump.
+    _, _, git_backend = git_bump_settings(args, config)
+    git_undo_bump_commit_result = git_undo_bump_commit(current_version, targeted=git_backend == "plumbing")
     if not git_undo_bump_commit_result.ok:
         error_code, error_message = git_undo_bump_commit_result.error
+        if error_code == "bumped_files_have_local_changes":
+            # Abort, so that neither local changes nor the tag are lost
+            fail(error_message, GitError)
         if error_code == "last_commit_is_not_the_bump_to_current_version":  # TODO: Use intern strings and test with `is`?
             # Abort in this case, since we don't want to delete the tag corresponding to latest bump (it's surely further down the log).
-            fail(error_message)
+            fail(error_message, GitError)
         else:
             # In this case we know last commit was the latest bump, but git failed somehow. We continue in the hope we can at least delete the tag since undo follows a "best effort" strategy
             logger.log(error_message)
@@ -247,57 +2555,619 @@ def do_git_undo(args, config, config_path):
         logger.log("Bump commit undone.")
 
     # Undo bump git tag
-    git_undo_bump_tag_result = git_undo_bump_tag(current_version)
+    tag = get_tag_template(config).format(version=current_version)
+    git_undo_bump_tag_result = git_undo_bump_tag(current_version, get_tag_template(config))
     if not git_undo_bump_tag_result.ok:
         # As above, undo follows a "best effort" strategy
         logger.log(git_undo_bump_tag_result.error)
     else:
         logger.log("Bump tag removed.")
 
+    return UndoResult(current_version, git_undo_bump_commit_result.ok, tag if git_undo_bump_tag_result.ok else None)
+
+
+# Daemon #######################################################################
+
+
+class DaemonStream(object):
+    # Relays what a daemon worker writes to stdout or stderr to the client, as JSON lines
+
+    def __init__(self, connection_file, name, lock):
+        self.connection_file = connection_file
+        self.name = name
+        self.lock = lock  # Shared by both streams, which may be written from several threads
+
+    def write(self, data):
+        import json
+        with self.lock:
+            self.connection_file.write(json.dumps({"stream": self.name, "data": data}) + "\n")
+        return len(data)
+
+    def flush(self):
+        with self.lock:
+            self.connection_file.flush()
+
+
+DAEMON_REQUEST_TIMEOUT = 2  # Seconds a client has to send its request, since others wait meanwhile
+
+
+def require_daemon_support():
+    import socket
+    if not hasattr(socket, "AF_UNIX") or not hasattr(os, "fork"):
+        fail("The bumpytrack daemon needs Unix sockets and fork, which are not available on this platform.")
+
+
+def serve(socket_path):
+    # Serves requests sent by `forward_to_daemon`, each one in a forked worker. Workers are isolated from each other,
+    # but start with the modules, parsed configs and Git helpers already loaded here.
+    import json
+    import socket
+    require_daemon_support()
+    if os.path.exists(socket_path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                os.remove(socket_path)  # Left by a daemon that didn't stop cleanly
+            else:
+                fail(f"Another bumpytrack daemon is already serving on '{socket_path}'.")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    logger.log(f"Serving on '{socket_path}'. Press Ctrl+C to stop.")
+
+    workers = set()
+    try:
+        while True:
+            connection, _ = server.accept()
+            for worker_pid in list(workers):
+                if os.waitpid(worker_pid, os.WNOHANG)[0]:
+                    workers.remove(worker_pid)
+
+            try:
+                connection.settimeout(DAEMON_REQUEST_TIMEOUT)
+                request = json.loads(connection.makefile("r", encoding="utf-8").readline())
+                request_cwd = request["cwd"]
+                request_config_path = os.path.join(request_cwd, request["config_path"])
+                connection.settimeout(None)
+            except socket.timeout:
+                logger.error(f"Ignoring client that sent no request within {DAEMON_REQUEST_TIMEOUT}s.")
+                connection.close()
+                continue
+            except (OSError, ValueError, KeyError, TypeError) as error:
+                logger.error(f"Ignoring malformed request: {error}")
+                connection.close()
+                continue
+            warm_up(request_cwd, request_config_path)
+            tracer.spans.clear()  # Workers only report about themselves
+
+            worker_pid = os.fork()
+            if worker_pid == 0:
+                exit_code = 1
+                try:
+                    server.close()
+                    exit_code = handle_daemon_request(connection, request, request_config_path)
+                finally:
+                    os._exit(exit_code)  # Never back into the serving loop
+            workers.add(worker_pid)
+            connection.close()
+    except KeyboardInterrupt:
+        logger.log("Stopped.")
+    finally:
+        server.close()
+        os.remove(socket_path)
+
+
+def warm_up(repo_path, config_path):
+    # Parses the config and starts the Git helpers of a repository, for its current and later requests to use
+    if os.path.isfile(config_path):
+        try:
+            load_config(config_path, use_cache=True)
+            save_config_caches()
+        except BumpytrackError:
+            pass  # The worker will fail the same way, and tell the client
+    repo_key = os.path.realpath(repo_path)
+    git_object_reader = git_object_readers.get(repo_key)
+    if (git_object_reader is None or not git_object_reader.alive()) and find_git_dir(config_path):
+        git_object_readers[repo_key] = GitObjectReader(repo_path)
+
+
+def handle_daemon_request(connection, request, config_path):
+    # Runs in a forked worker. Returns the exit code, which is also sent to the client.
+    import json
+    import threading
+    connection_file = connection.makefile("w", encoding="utf-8")
+    streams_lock = threading.Lock()
+    sys.stdout = DaemonStream(connection_file, "stdout", streams_lock)
+    sys.stderr = DaemonStream(connection_file, "stderr", streams_lock)
+
+    exit_code = 0
+    try:
+        os.chdir(request["cwd"])
+        args = parse_commandline(request["argv"])
+        args["config_cache"] = True  # Configs are already parsed and cached by the daemon
+        run_commandline(args)  # Which locks the repository if needed
+    except SystemExit as exit_request:
+        exit_code = exit_request.code if exit_request.code is not None else 0
+    except Exception:
+        import traceback
+        traceback.print_exc()
+        exit_code = 1
+
+    connection_file.write(json.dumps({"exit_code": exit_code}) + "\n")
+    connection_file.flush()
+    return exit_code
+
+
+def forward_to_daemon(socket_path, argv, config_path):
+    # Runs a command in the daemon serving at `socket_path`, relaying its output. Returns the exit code.
+    import json
+    import socket
+    require_daemon_support()
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError as error:
+        fail(f"Could not connect to the bumpytrack daemon at '{socket_path}': {error}")
+
+    with client, client.makefile("rw", encoding="utf-8") as connection_file:
+        connection_file.write(json.dumps({"argv": argv, "cwd": os.getcwd(), "config_path": config_path}) + "\n")
+        connection_file.flush()
+        for line in connection_file:
+            message = json.loads(line)
+            if "exit_code" in message:
+                return message["exit_code"]
+            stream = sys.stderr if message["stream"] == "stderr" else sys.stdout
+            stream.write(message["data"])
+    fail("Lost connection to the bumpytrack daemon.")
+
+
+# Library API ##################################################################
+
+
+LIBRARY_OPTIONS = (
+    "current_version", "new_version", "git_commit", "git_tag", "git_backend", "gitignore", "occurrence_index",
+    "async_pipeline", "jobs", "config_cache", "dry_run", "lock_timeout", "git_push", "git_remote", "changelog",
+)
+
+
+def bump(part=None, config_path="pyproject.toml", logger=None, file_system=None, vcs=None, **options):
+    # Bumps the version like the command line does, but in this process. `part` is the version part to bump, as in
+    # `increment_version`, and `options` are the command line ones, like `new_version="2.0.0"` or `git_commit=True`.
+    # Paths are relative to the current directory, and Git runs there too, unless other backends are given, like an
+    # InMemoryFileSystem with an InMemoryVCS (one on top of it is used if only the file system is given). Nothing is
+    # logged unless a `logger` is given. Returns a BumpResult, or raises a BumpytrackError if the bump can't be done.
+    if part is None and not options.get("new_version"):
+        raise ValueError("Either a part to bump or a new version is needed.")
+    return run_in_process(library_args(dict(options, command=part)), config_path, logger, do_bump_knowing_commit,
+                          file_system, vcs)
+
+
+def do_bump_knowing_commit(args, config, config_path):
+    result = do_bump(args, config, config_path)
+    git_commit_requested, _, _ = git_bump_settings(args, config)
+    if result.commit is None and git_commit_requested and not args.get("dry_run"):
+        result.commit = vcs.head()  # Commits created by Git's porcelain are only known by asking it
+    return result
+
+
+def undo(config_path="pyproject.toml", logger=None, file_system=None, vcs=None, **options):
+    # Undoes the last bump like `bumpytrack git-undo`, in this process, with the same backends as `bump`. Returns an
+    # UndoResult, or raises a BumpytrackError if the last commit is not the bump to the current version.
+    return run_in_process(library_args(dict(options, command="git-undo")), config_path, logger, do_git_undo,
+                          file_system, vcs)
+
+
+def library_args(args):
+    unknown_options = [name for name in args if name != "command" and name not in LIBRARY_OPTIONS]
+    if unknown_options:
+        raise TypeError(f"Unknown options: {', '.join(unknown_options)}.")
+    return args
+
+
+def run_in_process(args, config_path, new_logger, function, new_file_system=None, new_vcs=None):
+    # Runs `function(args, config, config_path)` logging to `new_logger` and on the given backends, and adds the
+    # timings of its steps to its result. Spans are taken out of the tracer, so that it doesn't grow with every call.
+    global logger, file_system, vcs
+    if new_vcs and not new_file_system:
+        raise ValueError("A file system is needed for the given VCS to commit files from.")
+    if new_file_system and not new_vcs:
+        new_vcs = InMemoryVCS(new_file_system)
+    previous_backends = logger, file_system, vcs
+    logger = new_logger or SilentLogger()
+    file_system, vcs = new_file_system or file_system, new_vcs or vcs
+    first_span = len(tracer.spans)
+    try:
+        result = run_locked(args, config_path, function)
+    finally:
+        logger, file_system, vcs = previous_backends
+        spans = tracer.spans[first_span:]
+        del tracer.spans[first_span:]
+    result.timings = {name: total_duration for name, (_, total_duration, _) in tracer.summary(spans).items()}
+    return result
+
+
+# Batches ######################################################################
+
+
+class CollectingLogger(Logger):
+    # Keeps messages to be shown later, so that those of different repositories don't get mixed
+
+    def __init__(self, verbose=False):
+        super(CollectingLogger, self).__init__(verbose)
+        self.messages = []
+
+    def log(self, message):
+        self.messages.append(message)
+
+    def error(self, message):
+        self.messages.append(message)
+
+
+class BatchEntryResult(object):
+    # How bumping (or undoing) one repository of a batch went. `result` is the BumpResult or UndoResult if it worked,
+    # and `error` the message otherwise. Both are None if it was skipped after another one failed.
+    def __init__(self, path, result=None, error=None, messages=(), duration=None):
+        self.path = path
+        self.result = result
+        self.error = error
+        self.messages = messages
+        self.duration = duration
+
+    @property
+    def ok(self):
+        return self.result is not None
+
+
+BATCH_ENTRY_KEYS = ("path", "command", "config_path") + LIBRARY_OPTIONS
+
+
+def load_batch_manifest(manifest_path):
+    # Returns one entry per repository, with the defaults at the top of the manifest applied and paths made absolute
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as file:
+            manifest = parse_toml(file.read())
+    except (OSError, ValueError) as error:
+        fail(f"Failed to load batch manifest at '{manifest_path}': {error}", ConfigError)
+
+    defaults = {key: value for key, value in manifest.items() if key != "repos"}
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    for repo in manifest.get("repos") or []:
+        entry = dict(defaults, **repo)
+        unknown_keys = [key for key in entry if key not in BATCH_ENTRY_KEYS]
+        if unknown_keys:
+            fail(f"Unknown keys in batch manifest '{manifest_path}': {', '.join(unknown_keys)}.", ConfigError)
+        if not entry.get("path") or not (entry.get("command") or entry.get("new_version")):
+            fail(f"Every repository in batch manifest '{manifest_path}' needs a path and a command (or new version).",
+                 ConfigError)
+        entry["path"] = os.path.normpath(os.path.join(manifest_dir, entry["path"]))
+        entries.append(entry)
+    if not entries:
+        fail(f"No repositories found in batch manifest '{manifest_path}'.", ConfigError)
+    return entries
+
+
+def run_batch_entry(entry, verbose=False):
+    # Runs in a worker process of `batch`
+    start = time.perf_counter()
+    collecting_logger = CollectingLogger(verbose)
+    options = {key: value for key, value in entry.items() if key in LIBRARY_OPTIONS}
+    config_path = entry.get("config_path") or "pyproject.toml"
+    try:
+        os.chdir(entry["path"])
+        if entry.get("command") == "git-undo":
+            result = undo(config_path, collecting_logger, **options)
+        else:
+            result = bump(entry.get("command"), config_path, collecting_logger, **options)
+    except (BumpytrackError, OSError) as error:
+        return BatchEntryResult(entry["path"], error=str(error), messages=collecting_logger.messages,
+                                duration=time.perf_counter() - start)
+    except Exception as error:
+        # Anything unexpected, like a config value of the wrong type, also fails this repository only
+        return BatchEntryResult(entry["path"], error=f"{type(error).__name__}: {error}",
+                                messages=collecting_logger.messages, duration=time.perf_counter() - start)
+    return BatchEntryResult(entry["path"], result, messages=collecting_logger.messages,
+                            duration=time.perf_counter() - start)
+
+
+def batch(entries, processes=None, keep_going=False, verbose=False, on_result=None):
+    # Bumps (or undoes) many repositories at once, each one in a process of a pool of `processes`. Each entry is a dict
+    # with the repository's `path`, `command` (a version part, or 'git-undo'), and optionally its `config_path` and any
+    # of the options `bump` takes. Unless `keep_going`, repositories not started yet are skipped after one fails.
+    # `on_result` is called with each BatchEntryResult as repositories finish. Returns them all, in the same order.
+    import concurrent.futures
+    results = [BatchEntryResult(entry["path"]) for entry in entries]
+    not_started = list(enumerate(entries))[::-1]
+    stopping = False
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        # Repositories are only submitted when there's a free process, so that none is started after one failed
+        running = {}
+        while not_started and len(running) < (processes or os.cpu_count() or 1):
+            index, entry = not_started.pop()
+            running[executor.submit(run_batch_entry, entry, verbose)] = index
+        while running:
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                results[running.pop(future)] = result
+                if on_result:
+                    on_result(result)
+                stopping = stopping or (not result.ok and not keep_going)
+                if not_started and not stopping:
+                    index, entry = not_started.pop()
+                    running[executor.submit(run_batch_entry, entry, verbose)] = index
+    return results
+
+
+def log_batch_entry_result(entry_result):
+    duration = f"{entry_result.duration:.2f}s"
+    for message in entry_result.messages:
+        logger.log_verbose(f"  {message}")
+    if not entry_result.ok:
+        logger.error(f"Repository '{entry_result.path}' failed ({duration}): {entry_result.error}")
+    elif isinstance(entry_result.result, UndoResult):
+        logger.log(f"Repository '{entry_result.path}': undid bump to '{entry_result.result.version}' ({duration}).")
+    else:
+        logger.log(f"Repository '{entry_result.path}': '{entry_result.result.current_version}' → "
+                   f"'{entry_result.result.new_version}' ({duration}).")
+
+
+def do_batch(args):
+    if not args.get("manifest"):
+        fail("Missing the batch manifest. Use --manifest.", ConfigError)
+    entries = load_batch_manifest(args.get("manifest"))
+    if args.get("dry_run"):
+        for entry in entries:
+            entry["dry_run"] = True
+
+    with tracer.span("batch", repositories=len(entries)):
+        results = batch(entries, args.get("processes"), args.get("keep_going"), args.get("verbose"),
+                        on_result=log_batch_entry_result)
+
+    failed = [result for result in results if result.error is not None]
+    skipped = [result for result in results if not result.ok and result.error is None]
+    logger.log(f"Done with {len(results) - len(failed) - len(skipped)} of {len(results)} repositories: "
+               f"{len(failed)} failed, {len(skipped)} skipped.")
+    if failed or skipped:
+        fail("Some repositories were not done: " + ", ".join(f"'{result.path}'" for result in failed + skipped) + ".")
+
 
 # Entrypoints and bootstrapping ################################################
 
 
-def load_config(config_path):
+DEFAULT_CONFIG = {
+    "git_commit": False,
+    "git_tag": False,
+    "git_backend": "porcelain",
+    "git_push": False,
+    "git_remote": "origin",
+    "gitignore": True,
+    "occurrence_index": False,
+    "async_pipeline": False,
+    "tag_template": "v{version}",
+}
+DEFAULT_FILE_REPLACE_CONFIG = {
+    "search_template": "{version}",
+}
+
+
+def parse_toml(text):
+    try:
+        import tomllib  # Python 3.11+
+    except ImportError:
+        import toml
+        return toml.loads(text)
+    return tomllib.loads(text)
+
+
+TOML_TABLE_HEADER_PATTERN = rb"^[ \t]*(\[\[?)[ \t]*([A-Za-z0-9_.\- \t]+?)[ \t]*\]\]?[ \t]*(?:#[^\n]*)?\r?$"
+TOML_CURRENT_VERSION_PATTERN = rb"^[ \t]*current_version[ \t]*=[ \t]*([\"'])([^\"'\\\r\n]*)\1"
+
+
+def bumpytrack_tables(contents):
+    # Finds the `tool.bumpytrack` table and its subtables in the pyproject.toml `contents`, so that big files don't
+    # have to be parsed whole. Returns their bytes, and the (start, end) byte span of the current version's value in
+    # the file if found. Returns None where unsure, like if bumpytrack settings are also written in some other way.
+    # Only the surroundings of each mention of bumpytrack are looked at, so this takes about the time of a `find`.
+    import re
+    header_pattern = re.compile(TOML_TABLE_HEADER_PATTERN, re.MULTILINE)
+    has_multiline_strings = b'"""' in contents or b"'''" in contents
+
+    def in_multiline_string(start, end):
+        # Whether `end` is inside a multi-line string started after `start`, which must be outside of one
+        if not has_multiline_strings:
+            return False
+        return contents.count(b'"""', start, end) % 2 == 1 or contents.count(b"'''", start, end) % 2 == 1
+
+    segments = []
+    main_segment = None
+    occurrence = contents.find(b"bumpytrack")
+    while occurrence != -1:
+        # Every mention must be in a table header (settings elsewhere, like dotted keys in `[tool]`, aren't supported)
+        segment_start = contents.rfind(b"\n", 0, occurrence) + 1
+        header = header_pattern.match(contents, segment_start)
+        if not header or header.end() < occurrence:
+            return None
+        if contents.find(b'"""', 0, segment_start) != -1 and contents.find(b"'''", 0, segment_start) != -1:
+            return None  # Not worth telling which strings are inside others
+        if in_multiline_string(0, segment_start):
+            return None
+        table = b".".join(part.strip() for part in header.group(2).split(b"."))
+        if table != b"tool.bumpytrack" and not table.startswith(b"tool.bumpytrack."):
+            return None
+
+        # Up to the next header, skipping the ones in multi-line strings
+        next_header = header_pattern.search(contents, header.end())
+        while next_header and in_multiline_string(segment_start, next_header.start()):
+            next_header = header_pattern.search(contents, next_header.end())
+        segment_end = next_header.start() if next_header else len(contents)
+        segments.append((segment_start, segment_end))
+        if table == b"tool.bumpytrack" and header.group(1) == b"[" and main_segment is None:
+            main_segment = (segment_start, segment_end)
+        occurrence = contents.find(b"bumpytrack", segment_end)
+
+    version_span = None
+    if main_segment:
+        version_match = re.compile(TOML_CURRENT_VERSION_PATTERN, re.MULTILINE).search(contents, *main_segment)
+        version_span = version_match.span(2) if version_match else None
+    return b"\n".join(contents[start:end] for start, end in segments), version_span
+
+
+def resolve_config(config):
+    # Applies defaults, so that the resolved config can be cached as is
+    resolved_config = dict(DEFAULT_CONFIG, **config)
+    if "file_replaces" in config:
+        resolved_config["file_replaces"] = [
+            dict(DEFAULT_FILE_REPLACE_CONFIG, **file_replace_config) for file_replace_config in config["file_replaces"]
+        ]
+    return resolved_config
+
+
+def load_config(config_path, use_cache=False):
+    with tracer.span("load_config", path=config_path):
+        return _load_config(config_path, use_cache)
+
+
+def _load_config(config_path, use_cache=False):
     config = None
     try:
-        pyproject_toml = toml.load(config_path)
-        config = pyproject_toml.get("tool", {}).get("bumpytrack", {})
-    except RuntimeError:
-        fail("Failed to load config file at '{config_path}'.")
+        if using_local_backends():
+            with open(config_path, "rb") as file:
+                config_file_contents = file.read()
+                config_file_stat = os.fstat(file.fileno())
+        else:
+            config_file_contents, config_file_stat = file_system.read_bytes(config_path), None
+
+        config_cache = config_cache_for(config_path) if use_cache and config_file_stat else None
+        if config_cache:
+            config = config_cache.get(config_path, config_file_stat, config_file_contents)
+            if config is not None:
+                logger.log_verbose(f"Using cached config for '{config_path}'.")
+                return config
+
+        tables = bumpytrack_tables(config_file_contents) if b"bumpytrack" in config_file_contents else None
+        if tables:
+            tables_contents, version_span = tables
+            pyproject_toml = parse_toml(tables_contents.decode("utf-8"))
+            config = resolve_config(pyproject_toml.get("tool", {}).get("bumpytrack", {}))
+            if version_span and \
+                    config_file_contents[version_span[0]:version_span[1]] == config.get("current_version", "").encode("utf-8"):
+                config["current_version_span"] = list(version_span)  # To be replaced right there when bumping
+        elif b"bumpytrack" in config_file_contents:
+            pyproject_toml = parse_toml(config_file_contents.decode("utf-8"))
+            config = resolve_config(pyproject_toml.get("tool", {}).get("bumpytrack", {}))
+        else:
+            config = {}  # Not worth parsing
+
+        if config_cache:
+            config_cache.put(config_path, config_file_stat, config_file_contents, config)
+    except (OSError, ValueError) as error:
+        fail(f"Failed to load config file at '{config_path}': {error}", ConfigError)
     return config
 
 
+TAG_HISTORY_COMMANDS = {
+    "history": do_history,
+    "latest": do_latest,
+    "verify": do_verify,
+}
+
+
 def dispatch(args, config, config_path):
     if args.get("command") == "git-undo":
+        if args.get("workspace"):
+            fail("Undoing workspace bumps is not supported.", ConfigError)
         do_git_undo(args, config, config_path)
+    elif args.get("command") in TAG_HISTORY_COMMANDS:
+        if args.get("workspace"):
+            fail("Tag history of workspaces is not supported.", ConfigError)
+        TAG_HISTORY_COMMANDS[args.get("command")](args, config, config_path)
+    elif args.get("workspace"):
+        do_workspace_bump(args, config, config_path)
     else:
         do_bump(args, config, config_path)
 
 
 def commandline_entrypoint():
-    # Parse args
+    # Fast path, not worth importing and setting up argparse for
+    if sys.argv[1:] == ["--version"]:
+        print(VERSION_MESSAGE)
+        return
+
+    args = parse_commandline(sys.argv[1:])
+    daemon_socket = args.get("daemon_socket")
+    if args.get("command") == "serve" or daemon_socket:
+        try:
+            if args.get("command") == "serve":
+                if not daemon_socket:
+                    fail("Missing the socket to serve on. Use --daemon-socket or set BUMPYTRACK_DAEMON_SOCKET.")
+                serve(daemon_socket)
+            else:
+                exit(forward_to_daemon(daemon_socket, sys.argv[1:], args.get("config_path") or "pyproject.toml"))
+        except BumpytrackError as error:
+            abort(error)
+    else:
+        run_commandline(args)
+
+
+def parse_commandline(argv):
     import argparse
     parser = argparse.ArgumentParser(description="Bump the semantic version of your project.")
-    parser.add_argument("--version", action="version", version="Version: 1.1.7")  # Replaced by bumpytrack itself
-    parser.add_argument("command", help="version token to bump ('major', 'minor' or 'patch') or 'git-undo' to remove last bump commit and tag")
+    parser.add_argument("--version", action="version", version=VERSION_MESSAGE)
+    parser.add_argument("command", help="version part to bump ('major', 'minor', 'patch', 'prerelease' or 'release', or 'auto' to pick one from the commits since the previous version), 'git-undo' to remove last bump commit and tag, 'history', 'latest' or 'verify' to query version tags, 'batch' to bump many repositories, or 'serve' to run as a daemon")
     parser.add_argument("--current-version", help="force current version instead using version in config file")
     parser.add_argument("--new-version", help="force new version instead using version in config file")
     parser.add_argument("--git-commit", dest="git_commit", action="store_true", default=None, help="Git: Commit files with version replacements")
     parser.add_argument("--no-git-commit", dest="git_commit", action="store_false", default=None)
     parser.add_argument("--git-tag", dest="git_tag", action="store_true", default=None, help="Git: Tag this reference with the new version")
     parser.add_argument("--no-git-tag", dest="git_tag", action="store_false", default=None)
+    parser.add_argument("--git-push", dest="git_push", action="store_true", default=None, help="Git: push the branch and new tags in a single atomic push, rebasing the bump and trying again if the remote branch moved")
+    parser.add_argument("--no-git-push", dest="git_push", action="store_false", default=None)
+    parser.add_argument("--git-remote", help="Git: remote to push to. Defaults to 'origin'")
+    parser.add_argument("--git-backend", choices=["porcelain", "plumbing"], help="Git: how to create the commit and tag. 'plumbing' avoids refreshing the whole index and working tree, but skips commit hooks. Defaults to 'porcelain'")
+    parser.add_argument("--gitignore", dest="gitignore", action="store_true", default=None, help="Skip files ignored by Git when expanding path patterns (default)")
+    parser.add_argument("--no-gitignore", dest="gitignore", action="store_false", default=None)
+    parser.add_argument("--occurrence-index", dest="occurrence_index", action="store_true", default=None, help="remember where version strings are, so that next bumps don't have to search whole files")
+    parser.add_argument("--no-occurrence-index", dest="occurrence_index", action="store_false", default=None)
+    parser.add_argument("--async-pipeline", dest="async_pipeline", action="store_true", default=None, help="run Git work that doesn't depend on the rewritten files while they're being rewritten")
+    parser.add_argument("--no-async-pipeline", dest="async_pipeline", action="store_false", default=None)
+    parser.add_argument("--jobs", type=int, help="number of files to process in parallel. Defaults to a value based on the CPU count")
+    parser.add_argument("--changelog", help="changelog file to add the changes since the previous version to, grouped by conventional commit type, in the bump commit")
+    parser.add_argument("--workspace", action="store_true", help="bump every package with its own config found under the config file's directory, in a single commit")
+    parser.add_argument("--package", dest="packages", action="append", metavar="PACKAGE", help="with --workspace, bump only this package. Can be repeated")
     parser.add_argument("--config-path", help="path to config file. Defaults to pyproject.toml in current directory")
+    parser.add_argument("--config-cache", action="store_true", default=bool(os.environ.get("BUMPYTRACK_CONFIG_CACHE")), help="cache parsed config files, in the Git dir by default. Also enabled by setting BUMPYTRACK_CONFIG_CACHE")
+    parser.add_argument("--manifest", help="with 'batch', TOML file listing the repositories to bump and their options")
+    parser.add_argument("--processes", type=int, help="with 'batch', number of repositories to bump in parallel. Defaults to the CPU count")
+    parser.add_argument("--keep-going", action="store_true", help="with 'batch', go on with other repositories when one fails")
+    parser.add_argument("--timings", action="store_true", help="print how long each step took")
+    parser.add_argument("--trace-file", help="write how long each step took to this file, in Chrome's trace format (open it in https://ui.perfetto.dev)")
+    parser.add_argument("--lock-timeout", type=float, help=f"seconds to wait for other bumps of the same repository to finish. Defaults to {DEFAULT_LOCK_TIMEOUT}")
+    parser.add_argument("--dry-run", action="store_true", help="tell what would be done, without changing anything")
+    parser.add_argument("--daemon-socket", default=os.environ.get("BUMPYTRACK_DAEMON_SOCKET"), help="Unix socket of a daemon started with 'serve' to run commands in, or to serve on. Also set by BUMPYTRACK_DAEMON_SOCKET")
     parser.add_argument("--verbose", action="store_true")
-    args_namespace = parser.parse_args()
-    args = vars(args_namespace)
+    args_namespace = parser.parse_args(argv)
+    return vars(args_namespace)
 
+
+def run_commandline(args):
     # Bootstrap
     logger.set_verbose(args.get("verbose"))
-    config_path = args.get("config_path") or "pyproject.toml"
-    config = load_config(config_path)
-
-    dispatch(args, config, config_path)
+    try:
+        with tracer.span("bumpytrack", command=args.get("command")):
+            if args.get("command") == "batch":
+                do_batch(args)  # Each repository has its own config
+            else:
+                run_locked(args, args.get("config_path") or "pyproject.toml", dispatch)
+    except BumpytrackError as error:
+        abort(error)
+    finally:
+        # Also when failing, since that's when timings are most interesting
+        if args.get("timings"):
+            logger.log("\nTimings:\n" + tracer.summary_table())
+        if args.get("trace_file"):
+            tracer.write_chrome_trace(args.get("trace_file"))
 
 
 if __name__ == "__main__":
@@ -1,7 +1,14 @@
 import contextlib
+import datetime
+import io
+import json
 import os
+import re
 import shutil
+import signal
+import socket
 import subprocess
+import time
 
 import pytest
 
@@ -102,6 +109,23 @@ def test_cli_info():
     assert process_output == "Version: 1.1.7"  # Replaced by bumpytrack itself
 
 
+def test_import_does_not_load_heavy_modules():
+    heavy_modules = ["argparse", "concurrent.futures", "subprocess", "tempfile", "threading", "toml", "tomllib"]
+    completed_process = run(
+        "python -c \"import sys, bumpytrack; print(' '.join(m for m in " + repr(heavy_modules) + " if m in sys.modules))\""
+    )
+    assert completed_process.stdout.strip() == ""
+
+
+def test_logger_writes_whole_lines_from_many_threads(capsys):
+    import concurrent.futures
+    logger = bumpytrack.Logger(verbose=True)
+    messages = [f"Replaced 1 occurrences of '1.2.3' in 'p/{index}.txt'." for index in range(2000)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(logger.log_verbose, messages))
+    assert sorted(capsys.readouterr().out.splitlines()) == sorted(messages)
+
+
 def test_bump_replaces_version_in_files(project_context):
     with cwd_at(project_context["project_path"]):
         completed_process = run(
@@ -134,6 +158,373 @@ def test_bump_commits_and_tags_repo(project_context):
         assert completed_process.stdout.strip() == "v1.2.4"
 
 
+def test_bump_commits_and_tags_repo_with_plumbing_backend(project_context):
+    with cwd_at(project_context["project_path"]):
+        # Staged changes to other files must not end up in the bump commit
+        with open(project_context["source_file_path"], "w", encoding="utf-8") as f: f.write("New source line.")
+        run("git add source.txt")
+
+        completed_process = run(
+            "bumpytrack patch --git-commit --git-tag --git-backend plumbing --verbose --config-path "
+            + project_context["config_path"]
+        )
+        # A few processes, whatever the number of files, and none refreshing the whole index
+        spawned_processes = re.search(r"Spawned (\d+) processes in", completed_process.stdout)
+        assert spawned_processes and int(spawned_processes.group(1)) <= 10
+        assert "s git reset" not in completed_process.stdout and "s git add" not in completed_process.stdout
+
+        completed_process = run("git log --oneline")
+        assert "Bumping version: 1.2.3 → 1.2.4" in completed_process.stdout
+
+        completed_process = run("git describe --tags --abbrev=0")
+        assert completed_process.stdout.strip() == "v1.2.4"
+
+        completed_process = run("git show --name-only --format= HEAD")
+        assert sorted(completed_process.stdout.split()) == ["pyproject.toml", "replaceable.txt"]
+
+        completed_process = run("git status --porcelain")
+        assert completed_process.stdout.strip() == "M  source.txt"
+
+
+@pytest.mark.parametrize("git_backend", ["porcelain", "plumbing"])
+def test_bump_commits_and_tags_repo_with_async_pipeline(project_context, git_backend):
+    with cwd_at(project_context["project_path"]):
+        with open(project_context["source_file_path"], "w", encoding="utf-8") as f: f.write("New source line.")
+
+        run(
+            f"bumpytrack patch --git-commit --git-tag --async-pipeline --git-backend {git_backend} --config-path "
+            + project_context["config_path"]
+        )
+
+        completed_process = run("git log --oneline")
+        assert "Bumping version: 1.2.3 → 1.2.4" in completed_process.stdout
+
+        completed_process = run("git describe --tags --abbrev=0")
+        assert completed_process.stdout.strip() == "v1.2.4"
+
+        completed_process = run("git show --name-only --format= HEAD")
+        assert sorted(completed_process.stdout.split()) == ["pyproject.toml", "replaceable.txt"]
+
+        completed_process = run("git status --porcelain")
+        assert completed_process.stdout.strip() == "M source.txt"
+
+
+def test_bump_with_occurrence_index_patches_indexed_occurrences(project_context):
+    with cwd_at(project_context["project_path"]):
+        with open(project_context["config_path"], "a", encoding="utf-8") as f:
+            f.write(
+                "\n[[tool.bumpytrack.file_replaces]]\npath = \"versions.txt\"\nsearch_template = \"a = {version}\"\n"
+                "\n[[tool.bumpytrack.file_replaces]]\npath = \"versions.txt\"\nsearch_template = \"b = {version}\"\n"
+            )
+        with open("versions.txt", "w", encoding="utf-8") as f:
+            f.write("a = 1.2.3\nb = 1.2.3, a = 1.2.3\n")
+
+        bumpytrack = "bumpytrack --occurrence-index --verbose --config-path " + project_context["config_path"]
+
+        completed_process = run(bumpytrack + " patch")  # Indexes occurrences
+        assert "indexed occurrences" not in completed_process.stdout
+
+        completed_process = run(bumpytrack + " minor --new-version 1.20.0")  # Longer version
+        assert "Using 3 indexed occurrences in 'versions.txt'." in completed_process.stdout
+        assert "Using 1 indexed occurrences in 'replaceable.txt'." in completed_process.stdout
+
+        completed_process = run(bumpytrack + " patch")  # Same length, patched in place
+        assert "Using 3 indexed occurrences in 'versions.txt'." in completed_process.stdout
+
+        with open("versions.txt", "r", encoding="utf-8") as f:
+            assert f.read() == "a = 1.20.1\nb = 1.20.1, a = 1.20.1\n"
+        with open(project_context["replaceable_file_path"], "r", encoding="utf-8") as f:
+            assert "We'll replace this: 1.20.1, utf-8 compatible: áèĩôü." in f.read()
+
+        # Changed files are searched again
+        with open("versions.txt", "w", encoding="utf-8") as f:
+            f.write("b = 1.20.1\na = 1.20.1\n")
+        completed_process = run(bumpytrack + " patch")
+        assert "indexed occurrences in 'versions.txt'" not in completed_process.stdout
+        with open("versions.txt", "r", encoding="utf-8") as f:
+            assert f.read() == "b = 1.20.2\na = 1.20.2\n"
+
+
+def test_bump_with_occurrence_index_finds_versions_already_there(project_context):
+    with cwd_at(project_context["project_path"]):
+        with open(project_context["config_path"], "a", encoding="utf-8") as f:
+            f.write("\n[[tool.bumpytrack.file_replaces]]\npath = \"versions.txt\"\n")
+        with open("versions.txt", "w", encoding="utf-8") as f:
+            f.write("next 1.2.4 now 1.2.3\n")
+
+        bumpytrack = "bumpytrack --occurrence-index --verbose --config-path " + project_context["config_path"]
+        run(bumpytrack + " patch")
+        completed_process = run(bumpytrack + " patch")
+        assert "Using 2 indexed occurrences in 'versions.txt'." in completed_process.stdout
+        run(bumpytrack + " patch")
+        with open("versions.txt", "r", encoding="utf-8") as f:
+            assert f.read() == "next 1.2.6 now 1.2.6\n"
+
+        # Edits keeping the size and modification time are noticed too
+        versions_stat = os.stat("versions.txt")
+        with open("versions.txt", "w", encoding="utf-8") as f:
+            f.write("then 1.2.6 now 1.2.6\n")
+        os.utime("versions.txt", ns=(versions_stat.st_atime_ns, versions_stat.st_mtime_ns))
+        completed_process = run(bumpytrack + " patch")
+        assert "indexed occurrences in 'versions.txt'" not in completed_process.stdout
+
+
+def test_bump_rewrites_only_the_version_in_the_config_table(project_context):
+    with cwd_at(project_context["project_path"]):
+        with open(project_context["config_path"], "r", encoding="utf-8") as f:
+            config_contents = f.read()
+        with open(project_context["config_path"], "w", encoding="utf-8") as f:
+            f.write(
+                "[tool.other]\ncurrent_version = \"1.2.3\"\ntemplate = \"\"\"\n[not.a.table]\n\"\"\"\n\n" +
+                config_contents.replace("current_version = \"1.2.3\"", "current_version='1.2.3'  # Bumped by bumpytrack")
+            )
+
+        run("bumpytrack patch --config-path " + project_context["config_path"])
+        with open(project_context["config_path"], "r", encoding="utf-8") as f:
+            assert f.read().startswith(
+                "[tool.other]\ncurrent_version = \"1.2.3\"\ntemplate = \"\"\"\n[not.a.table]\n\"\"\"\n\n"
+                "[tool.bumpytrack]\ncurrent_version='1.2.4'  # Bumped by bumpytrack\n"
+            )
+
+    assert bumpytrack.bumpytrack_tables(b"[tool]\nbumpytrack.current_version = \"1.2.3\"\n") is None  # Unsure
+
+
+def test_bump_replaces_all_templates_of_a_file_at_once(project_context):
+    with cwd_at(project_context["project_path"]):
+        with open(project_context["config_path"], "a", encoding="utf-8") as f:
+            f.write(
+                "\n[[tool.bumpytrack.file_replaces]]\npath = \"versions.txt\"\nsearch_template = \"{version}\"\n"
+                "\n[[tool.bumpytrack.file_replaces]]\npath = \"versions.txt\"\nsearch_template = \"version = {version}\"\n"
+                "\n[[tool.bumpytrack.file_replaces]]\npath = \"versions.txt\"\nsearch_template = \"Release {version}\"\n"
+            )
+        with open("versions.txt", "w", encoding="utf-8") as f:
+            f.write("version = 1.2.3\nbadge: 1.2.3\nRelease 1.2.3\n")
+
+        completed_process = run("bumpytrack patch --verbose --config-path " + project_context["config_path"])
+        assert "Replaced 1 occurrences of '1.2.3' in 'versions.txt'." in completed_process.stdout
+        assert "Replaced 1 occurrences of 'version = 1.2.3' in 'versions.txt'." in completed_process.stdout
+        assert "Replaced 1 occurrences of 'Release 1.2.3' in 'versions.txt'." in completed_process.stdout
+        with open("versions.txt", "r", encoding="utf-8") as f:
+            assert f.read() == "version = 1.2.4\nbadge: 1.2.4\nRelease 1.2.4\n"
+
+        with open("versions.txt", "w", encoding="utf-8") as f:
+            f.write("version = 1.2.4\nbadge: 1.2.4\n")
+        completed_process = run("bumpytrack patch --config-path " + project_context["config_path"], assert_success=False)
+        assert completed_process.returncode != 0
+        assert "Nothing to replace in file 'versions.txt' for 'Release 1.2.4'." in completed_process.stderr
+        with open("versions.txt", "r", encoding="utf-8") as f:
+            assert f.read() == "version = 1.2.4\nbadge: 1.2.4\n"  # Untouched
+
+
+@pytest.mark.parametrize("pipeline_option", ["--no-async-pipeline", "--async-pipeline"])
+def test_bump_changes_no_file_unless_all_can_be_replaced(project_context, pipeline_option):
+    with cwd_at(project_context["project_path"]):
+        with open(project_context["config_path"], "a", encoding="utf-8") as f:
+            for file_name in ("a.txt", "b.txt", "c.txt"):
+                f.write(f"\n[[tool.bumpytrack.file_replaces]]\npath = \"{file_name}\"\n")
+        for file_name, contents in (("a.txt", "1.2.3"), ("b.txt", "1.2.2"), ("c.txt", "1.2.1")):
+            with open(file_name, "w", encoding="utf-8") as f:
+                f.write(contents)
+        run("git add .")
+        run("git commit -m \"Add files.\"")
+        with open("other.txt", "w", encoding="utf-8") as f:
+            f.write("Staged.")
+        run("git add other.txt")
+
+        completed_process = run(
+            f"bumpytrack patch --git-commit --git-tag {pipeline_option} --config-path " + project_context["config_path"],
+            assert_success=False,
+        )
+        assert completed_process.returncode != 0
+        assert "Found problems in 2 files, so none was changed:" in completed_process.stderr
+        assert "Nothing to replace in file 'b.txt' for '1.2.3'." in completed_process.stderr
+        assert "Nothing to replace in file 'c.txt' for '1.2.3'." in completed_process.stderr
+        assert "Committing changes to Git." not in completed_process.stdout
+        # Not even temporary files left behind, nor the index changed
+        assert run("git status --porcelain --ignored").stdout.strip() == "A  other.txt"
+        assert run("git tag").stdout.strip() == ""
+
+
+def test_workspace_bump_commits_and_tags_selected_packages(project_context):
+    with cwd_at(project_context["project_path"]):
+        for package_dir, package_config in (
+            ("packages/a", "package_name = \"a\"\ncurrent_version = \"0.1.0\"\n"),
+            ("packages/b", "current_version = \"2.0.0\"\n"),
+            ("packages/c", "current_version = \"3.0.0\"\n"),
+        ):
+            os.makedirs(package_dir)
+            with open(os.path.join(package_dir, "pyproject.toml"), "w", encoding="utf-8") as f:
+                f.write(
+                    "[tool.bumpytrack]\n" + package_config +
+                    "[[tool.bumpytrack.file_replaces]]\npath = \"version.txt\"\n"
+                )
+            with open(os.path.join(package_dir, "version.txt"), "w", encoding="utf-8") as f:
+                f.write(package_config.split("\"")[-2])
+        run("git add .")
+        run("git commit -m \"Add packages.\"")
+
+        completed_process = run(
+            "bumpytrack minor --workspace --package a --package packages/b --git-commit --git-tag --config-path "
+            + project_context["config_path"]
+        )
+        assert completed_process.stdout.strip() == \
+               "Package 'a': '0.1.0' → '0.2.0'.\n" \
+               "Package 'packages/b': '2.0.0' → '2.1.0'.\n" \
+               "Replacing version string in files...\n" \
+               "Committing changes to Git.\n" \
+               "Adding version tag to Git."
+
+        for package_dir, expected_version in (("packages/a", "0.2.0"), ("packages/b", "2.1.0"), ("packages/c", "3.0.0")):
+            with open(os.path.join(package_dir, "version.txt"), "r", encoding="utf-8") as f:
+                assert f.read() == expected_version
+
+        completed_process = run("git log -1 --pretty=%B")
+        assert completed_process.stdout.strip() == \
+               "Bumping versions:\n\n" \
+               "a: 0.1.0 → 0.2.0\n" \
+               "packages/b: 2.0.0 → 2.1.0"
+        assert run("git status --porcelain").stdout.strip() == ""
+        assert sorted(run("git tag --points-at HEAD").stdout.split()) == ["a-v0.2.0", "packages/b-v2.1.0"]
+
+
+def test_bump_reports_timings_and_writes_trace_file(project_context):
+    with cwd_at(project_context["project_path"]):
+        completed_process = run(
+            "bumpytrack patch --git-commit --no-git-tag --timings --trace-file trace.json --config-path "
+            + project_context["config_path"]
+        )
+        timings_table = completed_process.stdout.split("Timings:\n")[1].splitlines()
+        assert timings_table[0].split() == ["Span", "Calls", "Total", "(ms)", "Max", "(ms)"]
+        assert [row.split()[0:2] for row in timings_table if row.startswith("file_replace")] == [["file_replace", "2"]]
+        assert [row.split()[0:3] for row in timings_table if row.startswith("git commit")] == [["git", "commit", "1"]]
+
+        with open("trace.json", "r", encoding="utf-8") as f:
+            trace_events = json.load(f)["traceEvents"]
+        file_replace_events = [event for event in trace_events if event["name"] == "file_replace"]
+        assert sorted(os.path.basename(event["args"]["path"]) for event in file_replace_events) == \
+               ["pyproject.toml", "replaceable.txt"]
+        for event in file_replace_events:
+            assert event["ph"] == "X" and event["dur"] >= 0
+            assert list(event["args"]["replacements"].values()) == [1]
+            if os.path.basename(event["args"]["path"]) == "pyproject.toml":
+                assert event["args"]["bytes_written"] == len("1.2.4")  # Only the version is rewritten, in place
+            else:
+                assert event["args"]["bytes_read"] >= os.path.getsize(event["args"]["path"])
+                assert event["args"]["bytes_written"] == os.path.getsize(event["args"]["path"])
+        git_commit_events = [event for event in trace_events if event["name"] == "git commit"]
+        assert git_commit_events[0]["args"]["exit_code"] == 0
+        assert git_commit_events[0]["args"]["argv"][:2] == ["git", "commit"]
+
+
+def test_bump_dry_run_changes_nothing(project_context):
+    with cwd_at(project_context["project_path"]):
+        completed_process = run(
+            "bumpytrack minor --git-commit --git-tag --dry-run --config-path " + project_context["config_path"]
+        )
+        assert "with 'We'll replace this: 1.3.0, utf-8 compatible: áèĩôü.' in 'replaceable.txt'." in \
+               completed_process.stdout
+        assert "Would add tags to Git: v1.3.0." in completed_process.stdout
+
+        completed_process = run("git status --porcelain")
+        assert completed_process.stdout.strip() == ""
+        completed_process = run("git tag")
+        assert completed_process.stdout.strip() == ""
+
+
+def test_bump_dry_run_replaces_only_the_version_in_the_config_table(project_context):
+    with cwd_at(project_context["project_path"]):
+        with open(project_context["config_path"], "r", encoding="utf-8") as f:
+            config_contents = f.read()
+        with open(project_context["config_path"], "w", encoding="utf-8") as f:
+            f.write("[tool.other]\ncurrent_version = \"1.2.3\"\n\n" + config_contents)
+
+        completed_process = run("bumpytrack patch --dry-run --config-path " + project_context["config_path"])
+        assert "Would replace 1 occurrences of 'current_version = \"1.2.3\"' with 'current_version = \"1.2.4\"' in " \
+               f"'{project_context['config_path']}'." in completed_process.stdout
+
+
+def test_bump_and_undo_on_in_memory_backends(mocker):
+    mocker.patch.object(bumpytrack, "run_command", side_effect=AssertionError("No process should be run"))
+    with open("tests/data/integration_tests_pyproject.toml", "rb") as file:
+        config_file_contents = file.read()
+    file_system = bumpytrack.InMemoryFileSystem({
+        "pyproject.toml": b'[tool.other]\ncurrent_version = "1.2.3"\n\n' + config_file_contents,
+        "replaceable.txt": "We'll replace this: 1.2.3, utf-8 compatible: áèĩôü.\n".encode("utf-8"),
+    })
+    vcs = bumpytrack.InMemoryVCS(file_system)
+    vcs.commit(["pyproject.toml", "replaceable.txt"], "Initial commit.")
+
+    result = bumpytrack.bump("minor", file_system=file_system, vcs=vcs, git_commit=True, git_tag=True)
+    assert (result.new_version, result.commit, vcs.tags) == ("1.3.0", vcs.head(), {"v1.3.0": vcs.head()})
+    assert vcs.last_commit_message() == "Bumping version: 1.2.3 → 1.3.0"
+    assert file_system.read_bytes("replaceable.txt").startswith(b"We'll replace this: 1.3.0,")
+    assert file_system.read_bytes("pyproject.toml").startswith(b'[tool.other]\ncurrent_version = "1.2.3"\n')
+
+    result = bumpytrack.undo(file_system=file_system, vcs=vcs)
+    assert (result.commit_undone, result.tag_removed, vcs.tags) == (True, "v1.3.0", {})
+    assert file_system.read_bytes("replaceable.txt").startswith(b"We'll replace this: 1.2.3,")
+    assert b'current_version = "1.2.3"' in file_system.read_bytes("pyproject.toml")
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX") or not hasattr(os, "fork"),
+                    reason="The daemon needs Unix sockets and fork")
+def test_daemon_runs_forwarded_commands(project_context):
+    socket_path = os.path.join(project_context["project_path"], "daemon.sock")
+    daemon = subprocess.Popen(["bumpytrack", "serve", "--daemon-socket", socket_path], stdout=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            if os.path.exists(socket_path): break
+            time.sleep(0.05)
+
+        with cwd_at(project_context["project_path"]):
+            bumpytrack = "bumpytrack --daemon-socket " + socket_path
+            completed_process = run(bumpytrack + " patch --git-commit --git-tag")
+            assert "New version: '1.2.4'." in completed_process.stdout
+            completed_process = run("git describe --tags --abbrev=0")
+            assert completed_process.stdout.strip() == "v1.2.4"
+
+            # Concurrent requests share the daemon's Git helpers
+            undo_dry_runs = [
+                subprocess.Popen(bumpytrack + " git-undo --dry-run", shell=True, stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE, universal_newlines=True)
+                for _ in range(16)
+            ]
+            for undo_dry_run in undo_dry_runs:
+                stdout, stderr = undo_dry_run.communicate(timeout=30)
+                assert undo_dry_run.returncode == 0, stderr
+                assert "Would undo the last commit and remove tag 'v1.2.4'." in stdout
+
+            # Clients that send nothing don't block others for long
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as idle_client:
+                idle_client.connect(socket_path)
+                completed_process = run(bumpytrack + " patch --dry-run")
+                assert "New version: '1.2.5'." in completed_process.stdout
+
+            # Only one daemon serves on a socket
+            completed_process = run(f"bumpytrack serve --daemon-socket {socket_path}", assert_success=False)
+            assert completed_process.returncode == 1
+            assert f"Another bumpytrack daemon is already serving on '{socket_path}'." in completed_process.stderr
+
+            completed_process = run(bumpytrack + " git-undo")
+            assert "Bump commit undone." in completed_process.stdout
+            completed_process = run("git tag")
+            assert completed_process.stdout.strip() == ""
+
+            completed_process = run(bumpytrack + " --current-version 1.2.3 sideways", assert_success=False)
+            assert completed_process.returncode == 1
+            assert "Part 'sideways' not recognized." in completed_process.stderr
+    finally:
+        daemon.send_signal(signal.SIGINT)
+        daemon.wait()
+    assert not os.path.exists(socket_path)
+
+
+def test_daemon_fails_cleanly_without_unix_sockets_or_fork(monkeypatch):
+    monkeypatch.delattr(os, "fork", raising=False)
+    with pytest.raises(bumpytrack.BumpytrackError, match="needs Unix sockets and fork"):
+        bumpytrack.serve("daemon.sock")
+
+
 def test_git_undo_removes_latest_bump_and_nothing_else(project_context):
     with cwd_at(project_context["project_path"]):
 
@@ -228,6 +619,332 @@ def test_git_undo_removes_latest_bump_commit_or_tag_separately(project_context):
         assert run("cat ./*").stdout == cat_project_before_last_bump
 
 
+def test_git_undo_with_plumbing_backend_only_restores_bumped_files(project_context):
+    with cwd_at(project_context["project_path"]):
+        bumpytrack = "bumpytrack --git-backend plumbing --config-path " + project_context["config_path"]
+        git_log_before_bump = run("git log --oneline").stdout
+        cat_project_before_bump = run("cat ./*").stdout
+
+        run(bumpytrack + " patch --git-commit --git-tag")
+
+        # Local changes to files not touched by the bump are kept
+        with open(project_context["source_file_path"], "a", encoding="utf-8") as f: f.write("Local change.")
+        completed_process = run(bumpytrack + " git-undo")
+        assert "Bump commit undone." in completed_process.stdout
+        assert run("git log --oneline").stdout == git_log_before_bump
+        assert run("git tag").stdout == ""
+        assert run("git status --porcelain").stdout.strip() == "M source.txt"
+        run("git checkout source.txt")
+        assert run("cat ./*").stdout == cat_project_before_bump
+
+        # Local changes to bumped files abort the undo
+        run(bumpytrack + " patch --git-commit --git-tag")
+        with open(project_context["replaceable_file_path"], "a", encoding="utf-8") as f: f.write("Local change.")
+        completed_process = run(bumpytrack + " git-undo", assert_success=False)
+        assert completed_process.returncode != 0
+        assert "Files changed by the bump commit have local changes." in completed_process.stderr
+        assert run("git tag").stdout.strip() == "v1.2.4"
+
+
+def test_tag_history_commands_read_versions_from_tags(project_context):
+    with cwd_at(project_context["project_path"]):
+        for tag in ("v1.0.0", "v1.2.3", "v1.10.0-rc.1", "v1.2.4", "latest", "v2"):
+            run("git tag " + tag)
+        bumpytrack = "bumpytrack --config-path " + project_context["config_path"]
+
+        completed_process = run(bumpytrack + " history")
+        assert completed_process.stdout.split() == ["v1.10.0-rc.1", "v1.2.4", "v1.2.3", "v1.0.0"]
+
+        completed_process = run(bumpytrack + " latest")
+        assert completed_process.stdout.strip() == \
+               "Latest version: '1.10.0-rc.1' (tag 'v1.10.0-rc.1').\n" \
+               "Latest release: '1.2.4' (tag 'v1.2.4').\n" \
+               "Next free versions from '1.2.3': major '2.0.0', minor '1.3.0', patch '1.2.5'."
+
+        completed_process = run(bumpytrack + " verify", assert_success=False)
+        assert completed_process.returncode != 0
+        assert "Version '1.2.3' in config is behind the latest tagged version '1.10.0-rc.1'." in completed_process.stderr
+
+        # Unchanged tags are not listed again, and new ones are found
+        completed_process = run(bumpytrack + " history --timings")
+        assert "git for-each-ref" not in completed_process.stdout
+        run("git tag v2.0.0")
+        completed_process = run(bumpytrack + " history --timings")
+        assert "git for-each-ref" in completed_process.stdout
+        assert completed_process.stdout.split()[:2] == ["v2.0.0", "v1.10.0-rc.1"]
+
+
+def test_bump_replaces_version_in_files_matching_patterns(project_context):
+    with cwd_at(project_context["project_path"]):
+        with open(project_context["config_path"], "a", encoding="utf-8") as f:
+            f.write(
+                "\n[[tool.bumpytrack.file_replaces]]\n"
+                "path = \"packages/**/version.txt\"\n"
+                "exclude = [\"packages/excluded/*\"]\n"
+            )
+        for package in ("a", "b/nested", "excluded", "ignored"):
+            os.makedirs(os.path.join("packages", package))
+            with open(os.path.join("packages", package, "version.txt"), "w", encoding="utf-8") as f:
+                f.write("1.2.3")
+        with open(".gitignore", "w", encoding="utf-8") as f:
+            f.write("packages/ignored/\n")
+
+        run("bumpytrack patch --no-git-commit --no-git-tag --jobs 2 --config-path " + project_context["config_path"])
+
+        expected_versions = {"a": "1.2.4", "b/nested": "1.2.4", "excluded": "1.2.3", "ignored": "1.2.3"}
+        for package, expected_version in expected_versions.items():
+            with open(os.path.join("packages", package, "version.txt"), "r", encoding="utf-8") as f:
+                assert f.read() == expected_version
+
+
+def test_library_api_bumps_and_undoes_in_process(project_context):
+    class CollectingLogger(bumpytrack.Logger):
+        def __init__(self):
+            super().__init__(verbose=False)
+            self.messages = []
+
+        def log(self, message):
+            self.messages.append(message)
+
+    with cwd_at(project_context["project_path"]):
+        collecting_logger = CollectingLogger()
+        spans_before = len(bumpytrack.tracer.spans)
+        result = bumpytrack.bump("minor", config_path="pyproject.toml", git_commit=True, git_tag=True,
+                                 logger=collecting_logger)
+        assert (result.current_version, result.new_version, result.tags) == ("1.2.3", "1.3.0", ["v1.3.0"])
+        assert sorted(result.modified_files) == ["pyproject.toml", "replaceable.txt"]
+        assert result.commit == run("git rev-parse HEAD").stdout.strip()
+        assert "file_replace" in result.timings and "git commit" in result.timings
+        assert len(bumpytrack.tracer.spans) == spans_before
+        assert collecting_logger.messages[:2] == ["Current version: '1.2.3'.", "New version: '1.3.0'."]
+
+        result = bumpytrack.undo(config_path="pyproject.toml")
+        assert (result.version, result.commit_undone, result.tag_removed) == ("1.3.0", True, "v1.3.0")
+
+        with pytest.raises(bumpytrack.GitError, match="Can only undo bumps corresponding to the most recent commit."):
+            bumpytrack.undo(config_path="pyproject.toml")
+        with pytest.raises(bumpytrack.VersionError):
+            bumpytrack.bump("sideways", config_path="pyproject.toml")
+        with pytest.raises(TypeError):
+            bumpytrack.bump("patch", config_path="pyproject.toml", git_comit=True)
+
+
+def test_bump_waits_for_concurrent_bumps_and_retries_on_version_changes(project_context, monkeypatch):
+    with cwd_at(project_context["project_path"]):
+        with bumpytrack.RepoLock(project_context["config_path"]):
+            completed_process = run(
+                "bumpytrack patch --lock-timeout 0.2 --config-path " + project_context["config_path"],
+                assert_success=False,
+            )
+        assert completed_process.returncode != 0
+        assert "Waiting for another bump of this repository to finish..." in completed_process.stdout
+        assert "Timed out after 0.2s waiting for another bump of this repository to finish." in completed_process.stderr
+
+        # Bumps using other caches wait for the same lock
+        other_cache_dir = os.path.join(os.path.dirname(project_context["project_path"]), "other-cache")
+        with bumpytrack.RepoLock(project_context["config_path"]):
+            completed_process = subprocess.run(
+                ["bumpytrack", "patch", "--lock-timeout", "0.2", "--config-path", project_context["config_path"]],
+                env={**os.environ, "BUMPYTRACK_CACHE_DIR": other_cache_dir},
+                encoding="utf-8",
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        assert "Timed out after 0.2s waiting for another bump of this repository to finish." in completed_process.stderr
+
+        # Someone not using bumpytrack at all bumps after the new version was computed, but before files are written,
+        # then commits something else
+        def race(bump_versions):
+            if bump_versions:
+                for file_name in ["pyproject.toml", "replaceable.txt"]:
+                    with open(file_name) as file:
+                        text = file.read()
+                    with open(file_name, "w") as file:
+                        file.write(text.replace("1.2.3", "1.2.4"))
+                run("git commit -q -am \"Bumping version: 1.2.3 → 1.2.4\"")
+            else:
+                run("echo changed >> source.txt && git commit -q -am \"Other change.\"")
+
+        get_file_replace_configs = bumpytrack.get_file_replace_configs
+        def get_file_replace_configs_racing(*args, **kwargs):
+            races.pop(0)()
+            return get_file_replace_configs(*args, **kwargs)
+        monkeypatch.setattr(bumpytrack, "get_file_replace_configs", get_file_replace_configs_racing)
+
+        races = [lambda: race(True), lambda: race(False), lambda: None]
+        result = bumpytrack.bump("patch", config_path="pyproject.toml", lock_timeout=0, git_commit=True)
+        assert races == []  # Tried again after each
+        assert (result.current_version, result.new_version) == ("1.2.4", "1.2.5")
+        assert run("git log -3 --pretty=%s").stdout.splitlines() == [
+            "Bumping version: 1.2.4 → 1.2.5", "Other change.", "Bumping version: 1.2.3 → 1.2.4"]
+        assert run("git status --porcelain").stdout == ""
+
+
+def test_bump_pushes_commit_and_tag_atomically_rebasing_if_the_remote_moved(project_context, tmpdir_factory,
+                                                                             monkeypatch):
+    monkeypatch.setattr(bumpytrack, "GIT_PUSH_BACKOFF", 0)
+    remote_path = str(tmpdir_factory.mktemp("remote").join("remote.git"))
+    other_clone_path = str(tmpdir_factory.mktemp("other").join("clone"))
+    with cwd_at(project_context["project_path"]):
+        branch = run("git symbolic-ref --short HEAD").stdout.strip()
+        run(f"git init -q --bare {remote_path}")
+        run(f"git remote add origin {remote_path}")
+        run(f"git push -q origin {branch}")
+
+    # Someone else pushes meanwhile, and tags the version after next
+    run(f"git clone -q {remote_path} {other_clone_path}")
+    with cwd_at(other_clone_path):
+        run("git config user.email \"test@test.test\"")
+        run("git config user.name test")
+        run("echo changed >> source.txt && git commit -q -am \"Other change.\"")
+        run("git tag v1.2.5 && git push -q origin HEAD v1.2.5")
+        other_commit = run("git rev-parse HEAD").stdout.strip()
+
+    with cwd_at(project_context["project_path"]):
+        result = bumpytrack.bump("patch", config_path="pyproject.toml", git_commit=True, git_tag=True, git_push=True)
+        remote_refs = run(f"git ls-remote {remote_path}").stdout
+        assert f"{result.commit}\trefs/heads/{branch}" in remote_refs
+        assert f"{result.commit}\trefs/tags/v1.2.4" in remote_refs
+        assert run("git rev-parse HEAD~1 v1.2.4").stdout.split() == [other_commit, result.commit]
+
+        # With a tag that can't be pushed, nothing is
+        with pytest.raises(bumpytrack.GitError, match="Tags rejected by 'origin': refs/tags/v1.2.5."):
+            bumpytrack.bump("patch", config_path="pyproject.toml", git_commit=True, git_tag=True, git_push=True)
+        assert run(f"git ls-remote {remote_path}").stdout == remote_refs
+
+
+def test_bump_adds_changes_since_last_bump_to_changelog(project_context, mocker):
+    def commit(message):
+        run(f"echo change >> source.txt && git commit -q -am \"{message}\"")
+        return run("git rev-parse --short HEAD").stdout.strip()
+
+    with cwd_at(project_context["project_path"]):
+        run("git tag v1.2.3")
+        feature_hash = commit("feat(api): add the thing")
+        fix_hash = commit("fix: handle empty input")
+        commit("chore: tidy up")
+        breaking_hash = commit("refactor!: drop old config")
+        other_hash = commit("Update readme")
+        with open("CHANGELOG.md", "w", encoding="utf-8") as file:
+            file.write("# Changelog\n\nOlder changes.\n")
+        run("git add CHANGELOG.md && git commit -q -m \"docs: start changelog\"")
+
+        bumpytrack.bump("patch", config_path="pyproject.toml", git_commit=True, changelog="CHANGELOG.md")
+        date = datetime.date.today().isoformat()
+        with open("CHANGELOG.md", "r", encoding="utf-8") as file:
+            assert file.read() == (
+                "# Changelog\n\n"
+                f"## 1.2.4 ({date})\n\n"
+                f"### Breaking changes\n\n- drop old config ({breaking_hash})\n\n"
+                f"### Features\n\n- **api:** add the thing ({feature_hash})\n\n"
+                f"### Bug fixes\n\n- handle empty input ({fix_hash})\n\n"
+                f"### Other changes\n\n- Update readme ({other_hash})\n\n"
+                "Older changes.\n"
+            )
+        assert "CHANGELOG.md" in run("git show --name-only --pretty=").stdout.split()
+
+        # Without tags, only commits after the ones already in the changelog are read
+        git_log_commits = mocker.spy(bumpytrack, "git_log_commits")
+        last_fix_hash = commit("fix: one more")
+        bumpytrack.bump("patch", config_path="pyproject.toml", git_commit=True, changelog="CHANGELOG.md")
+        assert [list(call.args) for call in git_log_commits.call_args_list] == \
+            [[run("git rev-parse HEAD~2").stdout.strip() + ".." + run("git rev-parse HEAD~1").stdout.strip()]]
+        with open("CHANGELOG.md", "r", encoding="utf-8") as file:
+            assert file.read().startswith(
+                f"# Changelog\n\n## 1.2.5 ({date})\n\n### Bug fixes\n\n- one more ({last_fix_hash})\n\n## 1.2.4 ")
+
+        with pytest.raises(bumpytrack.GitError, match="unknown revision"):
+            list(bumpytrack.git_log_commits("v9.9.9..HEAD"))
+
+
+def test_bump_adds_changes_to_changelog_again_after_undoing_it(project_context):
+    with cwd_at(project_context["project_path"]):
+        run("git tag v1.2.3")
+        run("echo change >> source.txt && git commit -q -am \"fix: handle empty input\"")
+        fix_hash = run("git rev-parse --short HEAD").stdout.strip()
+        with open("CHANGELOG.md", "w", encoding="utf-8") as file:
+            file.write("# Changelog\n")
+        run("git add CHANGELOG.md && git commit -q -m \"docs: start changelog\"")
+
+        for _ in range(2):
+            bumpytrack.bump("patch", config_path="pyproject.toml", git_commit=True, git_tag=True,
+                            changelog="CHANGELOG.md")
+            with open("CHANGELOG.md", "r", encoding="utf-8") as file:
+                assert f"### Bug fixes\n\n- handle empty input ({fix_hash})\n" in file.read()
+            bumpytrack.undo(config_path="pyproject.toml")
+
+
+def test_auto_bump_picks_part_from_new_commits_only(project_context, mocker):
+    def commit(message):
+        run(f"echo change >> source.txt && git commit -q -am \"{message}\"")
+
+    with cwd_at(project_context["project_path"]):
+        run("git tag v1.2.3")
+        commit("fix: a")
+        commit("feat: b")
+        git_log_commits = mocker.spy(bumpytrack, "git_log_commits")
+        assert bumpytrack.bump("auto", config_path="pyproject.toml", dry_run=True).new_version == "1.3.0"
+        assert bumpytrack.bump("auto", config_path="pyproject.toml", dry_run=True).new_version == "1.3.0"
+        assert git_log_commits.call_count == 1  # Nothing new to read the second time
+
+        last_commit = run("git rev-parse HEAD").stdout.strip()
+        run("echo change >> source.txt && git commit -q -am \"refactor: c\" -m \"BREAKING CHANGE: no more d\"")
+        result = bumpytrack.bump("auto", config_path="pyproject.toml", git_commit=True, git_tag=True)
+        assert result.new_version == "2.0.0"
+        assert git_log_commits.call_args.args == (last_commit + ".." + run("git rev-parse HEAD~1").stdout.strip(),)
+        with pytest.raises(bumpytrack.VersionError, match="No commits since the previous version"):
+            bumpytrack.bump("auto", config_path="pyproject.toml")
+
+        # Scanning stops at the first breaking change, or at the previous bump commit
+        commit_bump_part = mocker.spy(bumpytrack, "commit_bump_part")
+        assert bumpytrack.scan_bump_part("v1.2.3..HEAD~1") == ("major", False)
+        assert commit_bump_part.call_count == 1
+        commit("feat: e")
+        assert bumpytrack.scan_bump_part("HEAD") == ("minor", True)
+
+
+def test_batch_bumps_many_repositories(tmpdir):
+    for repo_name, current_version in (("api", "1.2.3"), ("web", "0.9.0"), ("broken", "2.0.0"), ("odd", "3")):
+        repo_path = str(tmpdir.join(repo_name))
+        os.makedirs(repo_path)
+        with cwd_at(repo_path):
+            with open("pyproject.toml", "w", encoding="utf-8") as f:
+                quoted_version = current_version if repo_name == "odd" else f"\"{current_version}\""  # Not a string
+                f.write(f"[tool.bumpytrack]\ncurrent_version = {quoted_version}\n"
+                        "\n[[tool.bumpytrack.file_replaces]]\npath = \"version.txt\"\n")
+            with open("version.txt", "w", encoding="utf-8") as f:
+                f.write("1.0.0" if repo_name == "broken" else current_version)
+            run("git init")
+            run("git config user.email \"test@test.test\"")
+            run("git config user.name test")
+            run("git add .")
+            run("git commit -m \"Initial commit.\"")
+
+    with cwd_at(str(tmpdir)):
+        with open("release.toml", "w", encoding="utf-8") as f:
+            f.write(
+                "command = \"minor\"\ngit_commit = true\ngit_tag = true\n"
+                "\n[[repos]]\npath = \"api\"\n"
+                "\n[[repos]]\npath = \"broken\"\n"
+                "\n[[repos]]\npath = \"odd\"\n"
+                "\n[[repos]]\npath = \"web\"\ncommand = \"major\"\n"
+            )
+        completed_process = run("bumpytrack batch --manifest release.toml --keep-going", assert_success=False)
+        assert completed_process.returncode != 0
+        assert f"Repository '{tmpdir.join('api')}': '1.2.3' → '1.3.0'" in completed_process.stdout
+        assert f"Repository '{tmpdir.join('web')}': '0.9.0' → '1.0.0'" in completed_process.stdout
+        assert f"Repository '{tmpdir.join('broken')}' failed" in completed_process.stderr
+        assert "Nothing to replace in file 'version.txt' for '2.0.0'." in completed_process.stderr
+        assert f"Repository '{tmpdir.join('odd')}' failed" in completed_process.stderr
+        assert "TypeError: " in completed_process.stderr
+        assert "Done with 2 of 4 repositories: 2 failed, 0 skipped." in completed_process.stdout
+
+    for repo_name, tag in (("api", "v1.3.0"), ("web", "v1.0.0")):
+        with cwd_at(str(tmpdir.join(repo_name))):
+            assert run("git tag --points-at HEAD").stdout.strip() == tag
+            assert run("git status --porcelain").stdout.strip() == ""
+
+
 # Unit Tests ###################################################################
 
 
@@ -236,8 +953,103 @@ def test_version_incrementing(fail_mocking):
 
     fail_mock.assert_not_called()
     stopping_at_fail(bumpytrack.increment_version)("1.2.3", "not_a_valid_part")
-    fail_mock.assert_called_once_with("Part 'not_a_valid_part' not recognized. Should be one of: major, minor or patch.")
+    fail_mock.assert_called_once_with(
+        "Part 'not_a_valid_part' not recognized. Should be one of: major, minor, patch, prerelease or release.",
+        bumpytrack.VersionError,
+    )
 
     assert stopping_at_fail(bumpytrack.increment_version)("1.2.3", "major") == "2.0.0"
     assert stopping_at_fail(bumpytrack.increment_version)("1.2.3", "minor") == "1.3.0"
     assert stopping_at_fail(bumpytrack.increment_version)("1.2.3", "patch") == "1.2.4"
+    assert stopping_at_fail(bumpytrack.increment_version)("1.2.3+build.5", "patch") == "1.2.4"
+
+    assert stopping_at_fail(bumpytrack.increment_version)("1.2.3", "prerelease") == "1.2.4-rc.1"
+    assert stopping_at_fail(bumpytrack.increment_version)("1.2.4-rc.1", "prerelease") == "1.2.4-rc.2"
+    assert stopping_at_fail(bumpytrack.increment_version)("1.2.4-beta", "prerelease") == "1.2.4-beta.1"
+    assert stopping_at_fail(bumpytrack.increment_version)("1.2.4-rc.2", "release") == "1.2.4"
+    assert stopping_at_fail(bumpytrack.increment_version)("1.2.4-rc.2", "patch") == "1.2.4"
+    assert stopping_at_fail(bumpytrack.increment_version)("1.3.0-rc.2", "minor") == "1.3.0"
+    assert stopping_at_fail(bumpytrack.increment_version)("1.3.1-rc.2", "minor") == "1.4.0"
+    assert stopping_at_fail(bumpytrack.increment_version)("2.0.0-rc.2", "major") == "2.0.0"
+
+    fail_mock.reset_mock()
+    stopping_at_fail(bumpytrack.increment_version)("1.2.3", "release")
+    fail_mock.assert_called_once_with(
+        "Version '1.2.3' is not a prerelease, so there's nothing to release.", bumpytrack.VersionError
+    )
+
+    fail_mock.reset_mock()
+    stopping_at_fail(bumpytrack.increment_version)("1.2", "patch")
+    fail_mock.assert_called_once_with(
+        "Failed parsing version '1.2'. It should be a semantic version, like '1.2.3' or '1.2.3-rc.1'.",
+        bumpytrack.VersionError,
+    )
+
+
+def test_versions_are_ordered_by_semver_precedence():
+    # Example from the SemVer 2.0 spec, plus build metadata and some invalid versions
+    ordered_versions = [
+        "1.0.0-alpha", "1.0.0-alpha.1", "1.0.0-alpha.beta", "1.0.0-beta", "1.0.0-beta.2", "1.0.0-beta.11",
+        "1.0.0-rc.1", "1.0.0+build.1", "1.0.1", "1.10.0",
+    ]
+    shuffled_versions = ordered_versions[5:] + ["v1.0.0", "1.0", "01.0.0", "1.0.0-01"] + ordered_versions[:5]
+
+    assert bumpytrack.invalid_versions(iter(shuffled_versions)) == ["v1.0.0", "1.0", "01.0.0", "1.0.0-01"]
+    assert [str(version) for version in bumpytrack.sort_versions(shuffled_versions)] == ordered_versions
+    assert str(bumpytrack.max_version(shuffled_versions)) == "1.10.0"
+    assert bumpytrack.max_version(["latest"]) is None
+
+    version = bumpytrack.parse_version("1.0.0-rc.1+build.1")
+    assert (version.major, version.minor, version.patch) == (1, 0, 0)
+    assert version.prerelease == ("rc", 1) and version.build == ("build", "1")
+    assert bumpytrack.parse_version("1.0.0-rc.1+build.1") is version  # Cached
+    assert bumpytrack.parse_version("1.0.0") <= bumpytrack.parse_version("1.0.0+build.1")  # Same precedence...
+    assert bumpytrack.parse_version("1.0.0") >= bumpytrack.parse_version("1.0.0+build.1")
+    assert bumpytrack.parse_version("1.0.0") != bumpytrack.parse_version("1.0.0+build.1")  # ...but not equal
+    assert len({bumpytrack.parse_version("1.0.0"), bumpytrack.Version(1, 0, 0)}) == 1
+
+
+def test_stream_replace_finds_matches_across_chunk_boundaries():
+    contents = b"1.2.3 abc 1.2.3" + b"x" * 7 + b"1.2.3"
+    for chunk_size in range(1, len(contents) + 2):
+        destination = io.BytesIO()
+        replacements = bumpytrack.stream_replace(io.BytesIO(contents), destination, b"1.2.3", b"1.10.0", chunk_size)
+        assert replacements == 3
+        assert destination.getvalue() == contents.replace(b"1.2.3", b"1.10.0")
+
+
+def test_stream_replace_many_prefers_longest_matches_across_chunk_boundaries():
+    contents = b"v = 1.2.3; 1.2.3; version = 1.2.3" * 3
+    replacements = {b"1.2.3": b"1.2.4", b"version = 1.2.3": b"version = 1.2.4", b"v = 1.2.3": b"v = 1.2.4"}
+    for chunk_size in range(1, len(contents) + 2):
+        destination = io.BytesIO()
+        offsets = {search: [] for search in replacements}
+        counts = bumpytrack.stream_replace_many(io.BytesIO(contents), destination, replacements, chunk_size, offsets)
+        assert counts == {b"1.2.3": 3, b"version = 1.2.3": 3, b"v = 1.2.3": 3}
+        assert destination.getvalue() == contents.replace(b"1.2.3", b"1.2.4")
+        assert offsets[b"v = 1.2.3"] == [0, 33, 66]
+
+
+def test_config_cache_skips_parsing_unchanged_configs(project_context, monkeypatch, mocker):
+    monkeypatch.setenv("BUMPYTRACK_CACHE_DIR", os.path.join(project_context["project_path"], "cache"))
+    parse_toml_spy = mocker.spy(bumpytrack, "parse_toml")
+
+    def load_config_from_new_process():
+        bumpytrack.config_caches.clear()
+        config = bumpytrack.load_config(project_context["config_path"], use_cache=True)
+        bumpytrack.save_config_caches()
+        return config
+
+    config = load_config_from_new_process()
+    assert parse_toml_spy.call_count == 1
+    assert config["current_version"] == "1.2.3"
+    assert config["git_backend"] == "porcelain"  # Defaults are applied
+    assert config["file_replaces"][0]["path"] == "replaceable.txt"
+
+    assert load_config_from_new_process() == config
+    assert parse_toml_spy.call_count == 1
+
+    with open(project_context["config_path"], "a", encoding="utf-8") as f:
+        f.write("\n# Changed!\n")
+    assert load_config_from_new_process() == config
+    assert parse_toml_spy.call_count == 2